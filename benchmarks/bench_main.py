@@ -0,0 +1,207 @@
+# -------------------------ABOUT --------------------------
+
+# Scaling benchmark for main(): builds synthetic databases and inputs
+# (benchmarks/synthetic.py) at several sizes, runs main() on each and
+# records the wall and thread CPU time of every phase (DB load, parse,
+# match, group expansion, write) from the run report main() writes.
+# Results are saved as JSON so runs of different versions can be compared.
+#
+#   python benchmarks/bench_main.py --scales 10000,100000,1000000
+#   python benchmarks/bench_main.py --compare benchmarks/results/<old>.json
+#   python benchmarks/bench_main.py --scales 100000 --group-size-mean 10 --phone-density 0.9
+
+# ---------------------------------------------------------
+
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import pandas as pd
+
+import main as tool
+from run_report import REPORT_PREFIX
+from synthetic import make_bottoms_up_db, make_input_files
+
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+# phases shown in the results table, as named in the run report
+REPORT_PHASES = ["DB load", "parse", "match", "group expansion", "write"]
+
+
+def read_run_report(output_folder):
+    """The run report main() wrote to output_folder."""
+    paths = sorted(glob.glob(os.path.join(output_folder, f"{REPORT_PREFIX}*.json")))
+    if not paths:
+        raise RuntimeError(f"main() wrote no run report to {output_folder}")
+    with open(paths[-1], encoding="utf-8") as f:
+        return json.load(f)
+
+def version_info():
+    info = {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+    }
+    version_path = os.path.join(REPO_DIR, "version.txt")
+    if os.path.exists(version_path):
+        with open(version_path) as f:
+            info["version"] = f.read().strip()
+    try:
+        info["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return info
+
+def run_scale(work_dir, db_rows, input_rows, formats, main_options, data_options=None):
+    """Generate data for one scale, run main() on it and return the timings.
+    data_options shape the database (see make_bottoms_up_frame)."""
+    root = os.path.join(work_dir, f"scale_{db_rows}")
+    shutil.rmtree(root, ignore_errors=True)
+    db_folder = os.path.join(root, "bu_database")
+    input_folder = os.path.join(root, "files_to_process")
+    output_folder = os.path.join(root, "results")
+    os.makedirs(db_folder)
+
+    start = time.perf_counter()
+    bottoms_up = make_bottoms_up_db(os.path.join(db_folder, "bottoms_up.db"), db_rows, **(data_options or {}))
+    make_input_files(input_folder, bottoms_up, input_rows, formats=formats)
+    del bottoms_up
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tool.main(
+        INPUT_FOLDER=input_folder, OUTPUT_FOLDER=output_folder, BOTTOMS_UP_FOLDER=db_folder,
+        logger=lambda message: None, report=True, **main_options
+    )
+    total_seconds = time.perf_counter() - start
+    # phases overlap in the pipeline and are summed over pool workers, so
+    # they need not add up to the total
+    phases = read_run_report(output_folder)["phases"]
+
+    output_rows = 0
+    for name in os.listdir(output_folder):
+        path = os.path.join(output_folder, name)
+        if name.endswith(".csv"):
+            output_rows += tool.count_csv_rows(path)
+        elif name.endswith(".xlsx"):
+            output_rows += tool.count_input_rows(path)
+        elif name.endswith(tool.COLUMNAR_EXTENSIONS):
+            output_rows += len(tool.read_input_file(path))
+    return {
+        "db_rows": db_rows,
+        "input_rows": input_rows,
+        "input_files": len(os.listdir(input_folder)),
+        "output_rows": output_rows,
+        "generate_seconds": round(generate_seconds, 3),
+        "total_seconds": round(total_seconds, 3),
+        "phase_seconds": {phase: round(entry["wall_sec"], 3) for phase, entry in phases.items()},
+        "phase_cpu_seconds": {phase: round(entry["cpu_sec"], 3) for phase, entry in phases.items()},
+    }
+
+def print_results(results, baseline=None):
+    phases = REPORT_PHASES
+    header = f"{'db rows':>10}{'input rows':>12}" + "".join(f"{p:>17}" for p in phases) + f"{'total':>10}"
+    print(header)
+    old = {r["db_rows"]: r for r in baseline["scales"]} if baseline else {}
+    for r in results["scales"]:
+        line = f"{r['db_rows']:>10,}{r['input_rows']:>12,}"
+        line += "".join(f"{r['phase_seconds'].get(p, 0):>17.2f}" for p in phases)
+        line += f"{r['total_seconds']:>10.2f}"
+        previous = old.get(r["db_rows"])
+        if previous and previous["total_seconds"]:
+            line += f"   {r['total_seconds'] / previous['total_seconds']:.2f}x of {baseline['info'].get('commit', 'baseline')}"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="comma-separated bottoms_up row counts")
+    parser.add_argument("--input-ratio", type=float, default=0.1,
+                        help="input rows per key type, as a fraction of the database rows")
+    parser.add_argument("--formats", default="csv,xlsx", help="input formats to generate (csv, xlsx, parquet, feather)")
+    parser.add_argument("--output-format", choices=tool.OUTPUT_FORMATS, help="output format (default: same as input)")
+    parser.add_argument("--backend", default="memory", choices=["memory", "sqlite", "snapshot"])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--stream", action="store_true", help="stream CSV and XLSX inputs")
+    parser.add_argument("--use-cache", action="store_true", help="allow the index cache (warm loads)")
+    # shape of the synthetic database (make_bottoms_up_frame)
+    parser.add_argument("--phone-density", type=float, default=0.5,
+                        help="chance each of phone1-phone5 is filled")
+    parser.add_argument("--serial-fraction", type=float, default=0.3, help="share of rows with a Serial Number")
+    parser.add_argument("--grouped-fraction", type=float, default=0.8, help="share of rows in a contact group")
+    parser.add_argument("--group-size-mean", type=float, default=3.0, help="mean contact group size")
+    parser.add_argument("--duplicate-id-fraction", type=float, default=0.05,
+                        help="share of rows reusing an earlier id")
+    parser.add_argument("--work-dir", help="where to generate data (default: a temp folder)")
+    parser.add_argument("--output", help="results JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    main_options = {
+        "backend": args.backend,
+        "workers": args.workers,
+        "stream_csv": args.stream,
+        "stream_excel": args.stream,
+        "use_cache": args.use_cache,
+        "output_format": args.output_format,
+    }
+    data_options = {
+        "phone_density": args.phone_density,
+        "serial_fraction": args.serial_fraction,
+        "grouped_fraction": args.grouped_fraction,
+        "group_size_mean": args.group_size_mean,
+        "duplicate_id_fraction": args.duplicate_id_fraction,
+    }
+    formats = tuple(args.formats.split(","))
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="owner_data_bench_")
+    results = {
+        "info": version_info(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "options": dict(main_options, formats=list(formats), input_ratio=args.input_ratio, data=data_options),
+        "scales": [],
+    }
+    try:
+        for db_rows in [int(s) for s in args.scales.split(",")]:
+            input_rows = max(int(db_rows * args.input_ratio), 1)
+            print(f"Running {db_rows:,} database rows / {input_rows:,} input rows per file...")
+            results["scales"].append(run_scale(work_dir, db_rows, input_rows, formats, main_options,
+                                                data_options))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
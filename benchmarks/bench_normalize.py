@@ -0,0 +1,74 @@
+# -------------------------ABOUT --------------------------
+
+# Microbenchmark: vectorized key normalization (normalize.py) against the
+# per-value .apply / chained .str paths it replaced. Also checks that both
+# give identical results on the generated data.
+#
+#   python benchmarks/bench_normalize.py [rows]
+
+# ---------------------------------------------------------
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import normalize_phone
+from normalize import normalize_ids, normalize_phones, normalize_serials
+
+
+def make_phones(rng, rows):
+    digits = rng.integers(10**9, 10**10, rows).astype(str)
+    styles = rng.integers(0, 6, rows)
+    values = np.where(styles == 0, "1" + digits, digits).astype(object)
+    values = np.where(styles == 1, [f"({d[:3]}) {d[3:6]}-{d[6:]}" for d in digits], values)
+    values = np.where(styles == 2, ["+1 " + d for d in digits], values)
+    values = np.where(styles == 3, "", values)
+    values = np.where(styles == 4, None, values)
+    return pd.Series(values, dtype=object)
+
+def make_ids(rng, rows):
+    pads = np.array(["", " ", "  ", "\t"], dtype=object)
+    ids = np.char.add("id", rng.integers(0, rows, rows).astype(str)).astype(object)
+    return pd.Series(pads[rng.integers(0, 4, rows)] + ids + pads[rng.integers(0, 4, rows)], dtype=object)
+
+def make_serials(rng, rows):
+    prefixes = np.array(["", "TX", "TX-", "tx-", " TX-"], dtype=object)
+    serials = np.char.add("sn", rng.integers(0, rows, rows).astype(str)).astype(object)
+    return pd.Series(prefixes[rng.integers(0, 5, rows)] + serials + " ", dtype=object)
+
+
+def timed(func, values, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(values)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(rows=1_000_000, repeat=3, seed=0):
+    rng = np.random.default_rng(seed)
+    cases = [
+        ("phone", make_phones(rng, rows),
+         lambda s: s.apply(normalize_phone), normalize_phones),
+        ("id", make_ids(rng, rows),
+         lambda s: s.astype(str).str.upper().str.strip(), normalize_ids),
+        ("BTP SN", make_serials(rng, rows),
+         lambda s: s.str.replace(r"(?i)^TX-?", "", regex=True).str.strip(), normalize_serials),
+    ]
+    print(f"{rows:,} values, best of {repeat}")
+    print(f"{'key':<8}{'apply (s)':>12}{'vectorized (s)':>16}{'speedup':>10}")
+    for name, values, baseline, vectorized in cases:
+        old_time, expected = timed(baseline, values, repeat)
+        new_time, result = timed(vectorized, values, repeat)
+        if not expected.equals(result):
+            raise RuntimeError(f"{name}: vectorized result differs from the .apply path")
+        print(f"{name:<8}{old_time:>12.3f}{new_time:>16.3f}{old_time / new_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,207 @@
+# -------------------------ABOUT --------------------------
+
+# Synthetic data for the benchmarks: a bottoms_up SQLite database in the
+# schema load_bottoms_up_db reads, and id / phone_number / BTP SN input
+# files (CSV, XLSX, Parquet or Feather) whose keys partly hit that database.
+#
+#   python benchmarks/synthetic.py <folder> [db_rows] [input_rows]
+
+# ---------------------------------------------------------
+
+import os
+import sqlite3
+import sys
+import numpy as np
+import pandas as pd
+
+
+BOTTOMS_UP_SCHEMA = """
+CREATE TABLE bottoms_up (
+    id TEXT,
+    contact_group_id TEXT,
+    phone1, phone2, phone3, phone4, phone5,
+    [Serial Number] TEXT,
+    date_created TEXT,
+    Owner TEXT,
+    [Input: Address] TEXT,
+    [Input: City] TEXT,
+    [Input: State] TEXT,
+    County TEXT,
+    State TEXT,
+    [Contact Type] TEXT,
+    [# of Interests] INTEGER,
+    is_latest_offer INTEGER,
+    Category TEXT,
+    [Total Value - Low ($)] REAL,
+    md_address TEXT,
+    md_city TEXT,
+    md_state TEXT
+)
+"""
+INSERT_CHUNK_ROWS = 100_000
+# keep generated .xlsx inputs within one sheet
+XLSX_MAX_ROWS = 1_048_575
+
+STATES = np.array(["TX", "OK", "NM", "LA", "CO", "ND", "WY", "PA"], dtype=object)
+COUNTIES = np.array([f"County {i}" for i in range(250)], dtype=object)
+CITIES = np.array([f"City {i}" for i in range(2000)], dtype=object)
+CATEGORIES = np.array(["Mineral", "Royalty", "Working", "ORRI", None], dtype=object)
+CONTACT_TYPES = np.array(["Person", "Company", "Trust", "Estate"], dtype=object)
+
+
+def _phone_values(rng, rows, density):
+    """One phone column in the mix of formats seen in real databases."""
+    numbers = rng.integers(2_000_000_000, 9_999_999_999, rows)
+    digits = numbers.astype(str).astype(object)
+    style = rng.integers(0, 4, rows)
+    values = np.where(style == 1, "1" + digits, digits)
+    values = np.where(
+        style == 2,
+        ["(" + d[:3] + ") " + d[3:6] + "-" + d[6:] for d in digits],
+        values
+    ).astype(object)
+    # style 3: stored as an integer, as some exports do
+    values[style == 3] = numbers[style == 3]
+    values[rng.random(rows) >= density] = None
+    return values
+
+def _group_ids(rng, rows, grouped_fraction, group_size_mean):
+    """contact_group_id per row with geometric group sizes."""
+    groups = np.full(rows, None, dtype=object)
+    grouped = np.flatnonzero(rng.random(rows) < grouped_fraction)
+    rng.shuffle(grouped)
+    sizes = rng.geometric(1 / max(group_size_mean, 1), len(grouped))
+    bounds = np.cumsum(sizes)
+    bounds = bounds[bounds < len(grouped)]
+    group_numbers = np.zeros(len(grouped), dtype=np.int64)
+    group_numbers[bounds] = 1
+    group_numbers = np.cumsum(group_numbers)
+    groups[grouped] = np.char.add("G", group_numbers.astype(str)).astype(object)
+    return groups
+
+def make_bottoms_up_frame(rows, phone_density=0.5, serial_fraction=0.3, grouped_fraction=0.8,
+                          group_size_mean=3.0, duplicate_id_fraction=0.05, seed=0):
+    """Build the synthetic bottoms_up rows as a DataFrame.
+
+    phone_density is the chance each of phone1-phone5 is filled,
+    serial_fraction the share of rows with a Serial Number, and group
+    sizes are geometric with mean group_size_mean over grouped_fraction of
+    the rows. duplicate_id_fraction of the rows reuse an earlier id.
+    """
+    rng = np.random.default_rng(seed)
+    id_numbers = np.arange(rows)
+    duplicates = np.flatnonzero(rng.random(rows) < duplicate_id_fraction)
+    id_numbers[duplicates] = rng.integers(0, rows, len(duplicates))
+    ids = np.char.add("BU", id_numbers.astype(str)).astype(object)
+
+    frame = {
+        "id": ids,
+        "contact_group_id": _group_ids(rng, rows, grouped_fraction, group_size_mean),
+    }
+    for i in range(1, 6):
+        frame[f"phone{i}"] = _phone_values(rng, rows, phone_density)
+
+    serials = np.char.add("SN", rng.integers(0, rows, rows).astype(str)).astype(object)
+    serials[rng.random(rows) >= serial_fraction] = None
+    frame["Serial Number"] = serials
+
+    days = rng.integers(0, 3650, rows)
+    frame["date_created"] = (np.datetime64("2015-01-01") + days).astype(str).astype(object)
+    frame["Owner"] = np.char.add("Owner ", id_numbers.astype(str)).astype(object)
+    frame["Input: Address"] = np.char.add(rng.integers(1, 9999, rows).astype(str), " Main St").astype(object)
+    frame["Input: City"] = CITIES[rng.integers(0, len(CITIES), rows)]
+    frame["Input: State"] = STATES[rng.integers(0, len(STATES), rows)]
+    frame["County"] = COUNTIES[rng.integers(0, len(COUNTIES), rows)]
+    frame["State"] = STATES[rng.integers(0, len(STATES), rows)]
+    frame["Contact Type"] = CONTACT_TYPES[rng.integers(0, len(CONTACT_TYPES), rows)]
+    frame["# of Interests"] = rng.integers(1, 40, rows)
+    frame["is_latest_offer"] = rng.integers(0, 2, rows)
+    frame["Category"] = CATEGORIES[rng.integers(0, len(CATEGORIES), rows)]
+    frame["Total Value - Low ($)"] = np.round(rng.random(rows) * 100_000, 2)
+    frame["md_address"] = frame["Input: Address"]
+    frame["md_city"] = frame["Input: City"]
+    frame["md_state"] = frame["Input: State"]
+    return pd.DataFrame(frame)
+
+def make_bottoms_up_db(db_path, rows, seed=0, **options):
+    """Write a synthetic bottoms_up database to db_path (replacing it).
+
+    options are passed to make_bottoms_up_frame. Returns the frame.
+    """
+    bottoms_up = make_bottoms_up_frame(rows, seed=seed, **options)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(BOTTOMS_UP_SCHEMA)
+        placeholders = ", ".join("?" * len(bottoms_up.columns))
+        for start in range(0, rows, INSERT_CHUNK_ROWS):
+            chunk = bottoms_up.iloc[start:start + INSERT_CHUNK_ROWS].astype(object)
+            conn.executemany(
+                f"INSERT INTO bottoms_up VALUES ({placeholders})",
+                chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    return bottoms_up
+
+
+def _input_keys(rng, known, rows, hit_rate, miss_prefix):
+    known = known[pd.notna(known)]
+    hits = rng.random(rows) < hit_rate if len(known) else np.zeros(rows, dtype=bool)
+    keys = np.char.add(miss_prefix, rng.integers(0, 10**9, rows).astype(str)).astype(object)
+    if hits.any():
+        keys[hits] = known[rng.integers(0, len(known), hits.sum())]
+    return keys
+
+def make_input_files(folder, bottoms_up, rows, key_types=("id", "phone_number", "BTP SN"),
+                     formats=("csv", "xlsx"), hit_rate=0.8, seed=0):
+    """Write one input file per key type and format into folder.
+
+    hit_rate of the keys are taken from the bottoms_up frame (ids lower-cased,
+    phones reformatted, serials with a random "TX-" prefix); the rest are
+    misses. Returns the written paths.
+    """
+    rng = np.random.default_rng(seed + 1)
+    os.makedirs(folder, exist_ok=True)
+    columns = {}
+    if "id" in key_types:
+        ids = _input_keys(rng, bottoms_up["id"].to_numpy(), rows, hit_rate, "MISS")
+        columns["id"] = pd.Series(ids).str.lower()
+    if "phone_number" in key_types:
+        phones = pd.concat([bottoms_up[f"phone{i}"] for i in range(1, 6)]).dropna().astype(str)
+        phones = phones.str.replace(r"\D", "", regex=True).str[-10:].to_numpy(dtype=object)
+        keys = _input_keys(rng, phones, rows, hit_rate, "1")
+        columns["phone_number"] = ["+1 (" + k[:3] + ") " + k[3:6] + "-" + k[6:10] for k in keys]
+    if "BTP SN" in key_types:
+        serials = _input_keys(rng, bottoms_up["Serial Number"].to_numpy(), rows, hit_rate, "NOSN")
+        prefixes = np.array(["", "TX-", "TX", "tx-"], dtype=object)[rng.integers(0, 4, rows)]
+        columns["BTP SN"] = prefixes + serials
+
+    paths = []
+    for key_col, keys in columns.items():
+        df = pd.DataFrame({"Row": np.arange(rows), key_col: keys, "Notes": "synthetic"})
+        name = key_col.replace(" ", "_").lower()
+        for fmt in formats:
+            path = os.path.join(folder, f"bench_{name}.{fmt}")
+            if fmt == "csv":
+                df.to_csv(path, index=False)
+            elif fmt == "parquet":
+                df.to_parquet(path, index=False)
+            elif fmt == "feather":
+                df.to_feather(path)
+            else:
+                df.iloc[:XLSX_MAX_ROWS].to_excel(path, index=False)
+            paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1]
+    db_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    input_rows = int(sys.argv[3]) if len(sys.argv) > 3 else db_rows // 10
+    os.makedirs(os.path.join(folder, "bu_database"), exist_ok=True)
+    frame = make_bottoms_up_db(os.path.join(folder, "bu_database", "bottoms_up.db"), db_rows)
+    for path in make_input_files(os.path.join(folder, "files_to_process"), frame, input_rows):
+        print(path)
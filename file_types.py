@@ -0,0 +1,13 @@
+# -------------------------ABOUT --------------------------
+
+# File types main.py reads and writes. Kept free of heavy imports so the
+# GUI can list input files before pandas is loaded.
+
+# ---------------------------------------------------------
+
+# input files main() picks up; columnar ones (Parquet/Feather, which need
+# pyarrow) are read with their column types instead of as text
+INPUT_EXTENSIONS = (".xlsx", ".csv", ".parquet", ".feather")
+COLUMNAR_EXTENSIONS = (".parquet", ".feather")
+# output formats main(output_format=...) can write; None mirrors the input
+OUTPUT_FORMATS = ("xlsx", "csv", "parquet", "feather")
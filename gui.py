@@ -1,16 +1,95 @@
 import os
 import sys
 import threading
+import multiprocessing
 import subprocess
 import io
 import customtkinter as ctk
 import tkinter as tk 
 from tkinter import messagebox
-from main import main as generate_owner_data
+from file_types import INPUT_EXTENSIONS
+from progress import ProgressQueue, format_eta
+# main (pandas, numpy, tqdm) is imported on a background thread by
+# DatabasePrewarm, so the window shows before it has loaded
 
 ctk.set_appearance_mode("dark")  # "dark" or "light"
 ctk.set_default_color_theme("dark-blue")  # optional theme
 
+# how often the Tk loop drains progress events from the worker thread (ms)
+PROGRESS_POLL_MS = 100
+
+
+class DatabasePrewarm:
+    """Loads the bottoms_up index on a background thread while the user
+    reviews the file list, so GENERATE RESULTS can start matching at once.
+
+    The index is tied to the size and mtime of the .db files it was loaded
+    from: start() loads it again when they changed, and take() only hands
+    out an index that still matches the database folder.
+    """
+
+    def __init__(self, database_folder):
+        self.database_folder = database_folder
+        self._lock = threading.Lock()
+        self._signature = None
+        self._lookup = None
+        self._thread = None
+
+    def _db_signature(self):
+        try:
+            return tuple(sorted(
+                (entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                for entry in os.scandir(self.database_folder)
+                if entry.is_file() and entry.name.lower().endswith(".db")
+            ))
+        except OSError:
+            return ()
+
+    def start(self):
+        """Start loading unless the current .db files are loaded or loading."""
+        signature = self._db_signature()
+        with self._lock:
+            if signature == self._signature:
+                return
+            # drop the index of the replaced database before loading the new one
+            self._signature, self._lookup = signature, None
+            if not signature:
+                return
+            self._thread = threading.Thread(target=self._load, args=(signature,), daemon=True)
+            self._thread.start()
+
+    def _load(self, signature):
+        try:
+            from main import open_lookup
+            lookup = open_lookup(self.database_folder, logger=lambda message: None)
+        except Exception:
+            # the run loads the database itself and reports the error
+            lookup = None
+        with self._lock:
+            if signature != self._signature:
+                return  # refreshed meanwhile; a newer load owns the slot
+            self._lookup = lookup
+            if lookup is None:
+                self._signature = None  # retry on the next start()
+
+    def loading(self):
+        with self._lock:
+            return self._thread is not None and self._thread.is_alive()
+
+    def take(self):
+        """The prewarmed index, after waiting for a load in progress; None
+        when there is none for the database currently in the folder."""
+        while True:
+            with self._lock:
+                thread = self._thread
+            if thread is not None:
+                thread.join()
+            with self._lock:
+                if self._thread is thread:
+                    if self._lookup is None or self._signature != self._db_signature():
+                        return None
+                    return self._lookup
+
 class MinimalToolUI(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -28,6 +107,10 @@ class MinimalToolUI(ctk.CTk):
         self.wait_dots_running = False
         self.wait_popup_dots = 0
 
+        # progress events and log lines from the worker thread
+        self.progress_queue = ProgressQueue()
+        self.processing = False
+
         base_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
         self.database_folder = os.path.join(base_dir, "bu_database")
         self.input_folder = os.path.join(base_dir, "files_to_process")
@@ -35,6 +118,8 @@ class MinimalToolUI(ctk.CTk):
         os.makedirs(self.database_folder, exist_ok=True)
         os.makedirs(self.input_folder, exist_ok=True)
 
+        self.prewarm = DatabasePrewarm(self.database_folder)
+
         # Title label
         self.title_label = ctk.CTkLabel(self,
                                         text="Generate Owner Data",
@@ -185,15 +270,17 @@ class MinimalToolUI(ctk.CTk):
         if hasattr(self, "wait_popup"):
             self.close_wait_popup()
 
-        """Refresh input (.xlsx/.csv) and database (.db) folders, update listbox, and re-check."""
+        """Refresh input (.xlsx/.csv/.parquet/.feather) and database (.db) folders, update listbox, and re-check."""
         self.file_text.configure(state="normal")  # <-- re-enable editing
         self.file_text.delete("1.0", "end")
 
-        self.input_files = self.load_folder_files(self.input_folder, (".xlsx", ".csv"))
+        self.input_files = self.load_folder_files(self.input_folder, INPUT_EXTENSIONS)
         self.db_files = self.load_folder_files(self.database_folder, (".db",))
 
         # Database section
-        self.file_text.insert("end", "Bottoms-up Database File:\n", "header")
+        # several .db files are shards of one database
+        db_header = "Bottoms-up Database Shards:" if len(self.db_files) > 1 else "Bottoms-up Database File:"
+        self.file_text.insert("end", db_header + "\n", "header")
         if self.db_files:
             for f in self.db_files:
                 self.file_text.insert("end", f + "\n")
@@ -212,6 +299,10 @@ class MinimalToolUI(ctk.CTk):
         self.file_text.configure(state="disabled")  # <-- lock after finishing
         self.check_files_ready()
 
+        # (re)load the index in the background once the window is drawn;
+        # a no-op when the .db file hasn't changed
+        self.after_idle(self.prewarm.start)
+
 
     def check_files_ready(self):
         input_ok = bool(self.input_files)
@@ -263,6 +354,33 @@ class MinimalToolUI(ctk.CTk):
             self.wait_label.configure(text=f"Processing{dots}\n{self.wait_popup_filename}")
 
 
+    def update_telemetry(self, event):
+        self.update_progress(event.fraction, event.filename)
+        if event.phase is None:
+            return
+        details = [f"{int(event.fraction*100)}% completed", event.phase]
+        if event.rows_per_sec:
+            details.append(f"{event.rows_per_sec:,.0f} rows/s")
+        if event.eta_sec is not None and event.fraction < 1.0:
+            details.append(f"ETA {format_eta(event.eta_sec)}")
+        self.message_label.configure(text=" · ".join(details))
+
+    def poll_progress(self):
+        """Apply queued log lines and the newest progress event on the Tk thread."""
+        if not self.processing:
+            return  # run finished; update_message drained the queue
+        event = self.drain_progress()
+        if event is not None:
+            self.update_telemetry(event)
+        self.after(PROGRESS_POLL_MS, self.poll_progress)
+
+    def drain_progress(self):
+        """Log every queued line; return the newest progress event (or None)."""
+        messages, event = self.progress_queue.drain()
+        for message in messages:
+            self.log_message(message)
+        return event
+
     def run_tool(self):
         folder = self.input_folder
         if not os.path.exists(folder):
@@ -278,6 +396,8 @@ class MinimalToolUI(ctk.CTk):
         first_file = self.input_files[0] if self.input_files else None
         self.show_wait_popup(filename=first_file)
 
+        self.processing = True
+        self.after(PROGRESS_POLL_MS, self.poll_progress)
         threading.Thread(target=self.run_main_process, daemon=True).start()
 
     def show_wait_popup(self, filename=None):
@@ -369,14 +489,20 @@ class MinimalToolUI(ctk.CTk):
             base_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
             output_folder = os.path.join(base_dir, "results")
 
+            from main import main as generate_owner_data
+
+            if self.prewarm.loading():
+                self.progress_queue.log("Loading the database...")
             generate_owner_data(
                 INPUT_FOLDER=self.input_folder,
                 OUTPUT_FOLDER=output_folder,
                 BOTTOMS_UP_FOLDER=self.database_folder,
-                logger=self.log_message,
-                progress_callback=self.update_progress
+                logger=self.progress_queue.log,
+                telemetry=self.progress_queue.put,
+                lookup=self.prewarm.take()
             )
 
+            self.processing = False
             self.dots_running = False
             self.close_wait_popup() 
             self.run_btn.configure(state="normal")
@@ -391,6 +517,7 @@ class MinimalToolUI(ctk.CTk):
             self.message_label.after(0, ask_open_folder)
 
         except Exception as e:
+            self.processing = False
             self.dots_running = False
             self.wait_dots_running = False
             self.animate_wait_popup = False
@@ -412,9 +539,14 @@ class MinimalToolUI(ctk.CTk):
             )
 
     def update_message(self, text):
-        self.message_label.after(0, lambda: self.message_label.configure(text=text))
+        def show():
+            # the run's last log lines come first, its final message wins
+            self.drain_progress()
+            self.message_label.configure(text=text)
+        self.message_label.after(0, show)
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # worker processes in the frozen .exe
     app = MinimalToolUI()
     app.mainloop()
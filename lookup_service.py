@@ -0,0 +1,169 @@
+# -------------------------ABOUT --------------------------
+
+# Local lookup service over the bottoms_up index, for scripts that need
+# main.py's id / phone / serial number matching without loading the
+# database themselves. The index is loaded once and shared by every
+# request thread (read-only, never copied); keys are sent in batches.
+#
+#   python lookup_service.py [--port 8765] [--backend sqlite]
+#
+#   POST /lookup  {"key_col": "phone_number", "keys": ["(555) 010-0199", ...]}
+#     -> {"columns": ["row", "phone_number", "id", "date_created", ...],
+#         "data": [[0, "5550100199", "BU12", "2019-04-02", ...], ...]}
+#   GET  /health  -> {"status": "ok", "database": "bottoms_up.db"}  (shards: "q1.db, q2.db")
+#
+# Each key is cleaned, split and matched exactly like the key column of an
+# input file; "row" is the key's position in the request and the other
+# columns are those enrich_row adds, one row per matched id (blank when
+# nothing matched).
+
+# ---------------------------------------------------------
+
+import argparse
+import json
+import os
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from main import (
+    BOTTOMS_UP_FOLDER, enrich_cols, enrich_frame, find_bottoms_up_dbs, format_output, key_cols, open_lookup,
+    prepare_input,
+)
+
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+# keys accepted per request; larger batches are refused with 413
+SERVICE_MAX_KEYS = 100_000
+# request body size accepted, checked against Content-Length before reading
+SERVICE_MAX_BYTES = SERVICE_MAX_KEYS * 256
+
+
+def lookup_keys(lookup, key_col, keys):
+    """Enriched rows for a batch of raw keys of one key column, as a frame
+    with the columns row, key_col and enrich_cols."""
+    if key_col not in key_cols:
+        raise ValueError(f"key_col must be one of {key_cols}, not {key_col!r}")
+    df = pd.DataFrame({
+        "row": range(len(keys)),
+        key_col: [None if key is None else str(key) for key in keys],
+    })
+    df = prepare_input(df)
+    if not len(df):
+        return df.reindex(columns=list(df.columns) + [c for c in enrich_cols if c not in df.columns])
+    return format_output(enrich_frame(df, lookup, key_col))
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    server_version = "OwnerDataLookup/1.0"
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send_json(404, {"error": f"unknown path {self.path}"})
+        database = ", ".join(os.path.basename(db_path) for db_path in self.server.db_paths)
+        self._send_json(200, {"status": "ok", "database": database})
+
+    def do_POST(self):
+        if self.path != "/lookup":
+            return self._send_json(404, {"error": f"unknown path {self.path}"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            self.close_connection = True
+            return self._send_json(400, {"error": "bad request: invalid Content-Length"})
+        if length > SERVICE_MAX_BYTES:
+            # the body is left unread, so the connection can't be reused
+            self.close_connection = True
+            return self._send_json(413, {"error": f"at most {SERVICE_MAX_BYTES} bytes per request"})
+        try:
+            request = json.loads(self.rfile.read(length))
+            key_col, keys = request["key_col"], request["keys"]
+            if not isinstance(keys, list):
+                raise ValueError("keys must be a list")
+        except (ValueError, KeyError, TypeError) as e:
+            return self._send_json(400, {"error": f"bad request: {e}"})
+        if len(keys) > SERVICE_MAX_KEYS:
+            return self._send_json(413, {"error": f"at most {SERVICE_MAX_KEYS} keys per request"})
+
+        try:
+            rows = lookup_keys(self.server.lookup, key_col, keys)
+        except ValueError as e:
+            return self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self.server.logger(f"Lookup failed: {e}")
+            return self._send_json(500, {"error": str(e)})
+        self._send(200, rows.to_json(orient="split", index=False).encode("utf-8"))
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"))
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.logger(f"{self.address_string()} {format % args}")
+
+
+class LookupServer(ThreadingHTTPServer):
+    """HTTP server whose request threads share one lookup backend."""
+
+    daemon_threads = True
+
+    def __init__(self, lookup, db_paths, host=SERVICE_HOST, port=SERVICE_PORT, logger=print):
+        self.lookup = lookup
+        self.db_paths = db_paths
+        self.logger = logger
+        super().__init__((host, port), LookupHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def start_service(BOTTOMS_UP_FOLDER=BOTTOMS_UP_FOLDER, host=SERVICE_HOST, port=SERVICE_PORT, backend="memory",
+                  use_cache=True, logger=print, lookup=None):
+    """Load the lookup (unless one is given) and serve it on a background
+    thread. port=0 picks a free port; call shutdown() on the returned
+    server to stop it."""
+    db_paths = find_bottoms_up_dbs(BOTTOMS_UP_FOLDER, logger=logger)
+    if lookup is None:
+        lookup = open_lookup(BOTTOMS_UP_FOLDER, backend, logger=logger, use_cache=use_cache)
+    server = LookupServer(lookup, db_paths, host, port, logger=logger)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger(f"Lookup service listening on {server.url}")
+    return server
+
+
+def request_lookup(url, key_col, keys, timeout=60):
+    """Client side: POST a batch of keys to a running service and return the
+    enriched rows as a DataFrame."""
+    request = urllib.request.Request(
+        f"{url}/lookup", data=json.dumps({"key_col": key_col, "keys": list(keys)}).encode("utf-8"),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        payload = json.load(response)
+    return pd.DataFrame(payload["data"], columns=payload["columns"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve bottoms_up lookups on localhost.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--backend", default="memory", choices=["memory", "sqlite", "snapshot"])
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the index cache")
+    args = parser.parse_args()
+    server = start_service(host=args.host, port=args.port, backend=args.backend, use_cache=not args.no_cache)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -11,13 +11,103 @@
 
 import os
 import sys
+import cProfile
+import hashlib
+import json
+import multiprocessing
+import pathlib
+import pickle
+import shutil
+import numpy as np
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 import re
+from collections import Counter, deque
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
 import sqlite3
 from tqdm import tqdm
+from file_types import COLUMNAR_EXTENSIONS, INPUT_EXTENSIONS, OUTPUT_FORMATS
+from run_report import RunReport
+from pipeline import run_pipeline
+from progress import PHASE_LOAD_DB, PHASE_MATCH, PHASE_PARSE, PHASE_PREFLIGHT, PHASE_WRITE, ProgressTracker
+from normalize import normalize_ids, normalize_phones, normalize_serials
+from stream_io import (
+    EXCEL_MAX_ROWS, count_columnar_rows, count_excel_rows, iter_columnar_chunks, iter_excel_chunks, open_output_stream,
+    read_columnar_columns,
+)
 
 
 phone_cols = ['phone1', 'phone2', 'phone3', 'phone4', 'phone5']
+bottoms_up_cols = [
+    "id", "contact_group_id", "phone1", "phone2", "phone3", "phone4", "phone5", "Serial Number",
+    "date_created", "Owner", "Input: Address", "Input: City", "Input: State",
+    "County", "State", "Contact Type", "# of Interests", "is_latest_offer", "Category",
+    "Total Value - Low ($)", "md_address", "md_city", "md_state"
+]
+enrich_cols = [
+    "id", "date_created", "Owner", "Input: Address", "Input: City", "Input: State",
+    "County", "State", "Contact Type", "# of Interests", "contact_group_id",
+    "is_latest_offer", "Category", "Total Value - Low ($)",
+    "md_address", "md_city", "md_state"
+]
+# low-cardinality bottoms_up columns kept dictionary-encoded (category) when
+# they have fewer distinct values than CATEGORY_MAX_RATIO of the rows
+category_cols = [
+    "Input: City", "Input: State", "County", "State", "Contact Type",
+    "is_latest_offer", "Category", "md_city", "md_state"
+]
+CATEGORY_MAX_RATIO = 0.5
+# bottoms_up text columns parsed as numbers when that is lossless
+numeric_cols = ["# of Interests", "Total Value - Low ($)"]
+# enrichment columns written as nullable integers to columnar outputs when
+# every value is a whole number (flags the database may store as REAL)
+integer_cols = ["is_latest_offer"]
+# input key columns, in the order main() picks the one to match on
+key_cols = ["id", "phone_number", "BTP SN"]
+# input rows enriched per vectorized batch (one progress update per batch)
+ENRICH_BATCH_ROWS = 5000
+# multi-key mode: output column naming the key column(s) each match came from
+MATCHED_BY_COL = "Matched By"
+MATCHED_BY_SEP = " + "
+# distinct keys resolved per lookup call when planning a batch of files
+PLAN_BATCH_KEYS = 50_000
+# raw input rows read per chunk in streaming mode
+STREAM_CHUNK_ROWS = 50_000
+# whole files pool workers parse ahead of the one being matched
+PIPELINE_READ_AHEAD = 4
+# preflight: contact groups listed per file, largest first
+PREFLIGHT_TOP_GROUPS = 5
+# what the output-size guard does with a file over max_file_rows
+GUARD_ACTIONS = ("skip", "stream")
+# output format of files the guard streams instead of writing an .xlsx
+GUARD_STREAM_FORMAT = "csv"
+# sidecar cache of the built BottomsUpIndex, kept next to the .db file;
+# bump the version whenever the index layout changes
+INDEX_CACHE_NAME = ".bottoms_up_index.cache"
+INDEX_CACHE_VERSION = 5
+# record of finished files kept in the output folder for incremental reruns
+RUN_MANIFEST_NAME = ".run_manifest.json"
+RUN_MANIFEST_VERSION = 1
+# normalized key tables and indexes of backend="sqlite", kept next to the
+# .db file (not named *.db, so it is never taken for a shard)
+SQLITE_KEYS_NAME = ".bottoms_up_keys.sqlite"
+# memory-mapped snapshot of the table and its lookup indexes (backend="snapshot"),
+# kept next to the .db file; bump the version whenever its layout changes
+SNAPSHOT_DIR_NAME = ".bottoms_up_snapshot"
+SNAPSHOT_POINTER_NAME = "current.json"
+SNAPSHOT_VERSION = 4
+# value kinds of snapshot text columns (anything else is None)
+SNAPSHOT_STR = 1
+SNAPSHOT_EXTRA = 2
+# sharded databases: shards queried / loaded at once, the record column naming
+# the shard an enriched row came from, and the _pos offset between shards
+# (so records sort as if the shards were one table, in file name order)
+SHARD_THREADS = 8
+SHARD_COL = "_shard"
+SHARD_POS_STRIDE = 1 << 40
 
 # ----------------------- DIRECTORIES -----------------------
 def exe_dir():
@@ -38,17 +128,38 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 os.makedirs(BOTTOMS_UP_FOLDER, exist_ok=True)
 
 # ----------------------- FUNCTIONS -----------------------
-# load bottoms-up database
-def load_bottoms_up_db(BOTTOMS_UP_FOLDER, logger=print):
-    db_files = [f for f in os.listdir(BOTTOMS_UP_FOLDER) if f.endswith(".db")]
+# locate the bottoms-up database files: a single .db, or several shards
+# with the same schema that are queried together (see ShardedLookup)
+def find_bottoms_up_dbs(BOTTOMS_UP_FOLDER, logger=print):
+    db_files = sorted(f for f in os.listdir(BOTTOMS_UP_FOLDER) if f.endswith(".db"))
     if not db_files:
         logger(f"No .db file found in {BOTTOMS_UP_FOLDER}")
         raise RuntimeError(f"No .db file found in {BOTTOMS_UP_FOLDER}")
-    elif len(db_files) > 1:
+    return [os.path.join(BOTTOMS_UP_FOLDER, f) for f in db_files]
+
+# locate the single bottoms-up database file
+def find_bottoms_up_db(BOTTOMS_UP_FOLDER, logger=print):
+    db_paths = find_bottoms_up_dbs(BOTTOMS_UP_FOLDER, logger=logger)
+    if len(db_paths) > 1:
         logger(f"Multiple .db files found in {BOTTOMS_UP_FOLDER}, expected only one.")
         raise RuntimeError(f"Multiple .db files found in {BOTTOMS_UP_FOLDER}, expected only one.")
 
-    bottoms_up_db_path = os.path.join(BOTTOMS_UP_FOLDER, db_files[0])
+    return db_paths[0]
+
+def db_sidecar_path(BOTTOMS_UP_FOLDER, name, db_path=None):
+    """Path of a cache kept next to the database: name itself for the
+    folder's only .db file, name tagged with the shard's file name when
+    db_path is one of several shards."""
+    if db_path is None:
+        return os.path.join(BOTTOMS_UP_FOLDER, name)
+    root, ext = os.path.splitext(name)
+    shard = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(BOTTOMS_UP_FOLDER, f"{root}.{shard}{ext}")
+
+# load bottoms-up database
+def load_bottoms_up_db(BOTTOMS_UP_FOLDER, logger=print, report=None, db_path=None):
+    # db_path: one shard of BOTTOMS_UP_FOLDER instead of its only .db file
+    bottoms_up_db_path = db_path or find_bottoms_up_db(BOTTOMS_UP_FOLDER, logger=logger)
 
     # Load bottoms_up table from SQLite database and standardize id columns
     conn = sqlite3.connect(bottoms_up_db_path)
@@ -86,21 +197,51 @@ def load_bottoms_up_db(BOTTOMS_UP_FOLDER, logger=print):
     conn.close()
 
     # validate required columns
-    required_cols_bottoms_up = [
-        "id", "contact_group_id", "phone1", "phone2", "phone3", "phone4", "phone5", "Serial Number",
-        "date_created", "Owner", "Input: Address", "Input: City", "Input: State",
-        "County", "State", "Contact Type", "# of Interests", "is_latest_offer", "Category",
-        "Total Value - Low ($)", "md_address", "md_city", "md_state"
-        ]
-    missing_cols = [c for c in required_cols_bottoms_up if c not in bottoms_up.columns]
+    missing_cols = [c for c in bottoms_up_cols if c not in bottoms_up.columns]
     if missing_cols:
         logger(f"❌ Database error: Missing required columns {missing_cols}")
         raise RuntimeError(f"Database error: Missing required columns {missing_cols}")
 
-    bottoms_up['id'] = bottoms_up['id'].astype(str).fillna('').str.upper().str.strip()
-    for col in phone_cols:
-        bottoms_up[col] = bottoms_up[col].apply(normalize_phone)
+    loaded_bytes = bottoms_up.memory_usage(deep=True).sum()
+
+    bottoms_up['id'] = normalize_ids(bottoms_up['id'])
+    with (report or RunReport()).phase("phone normalization"):
+        for col in phone_cols:
+            bottoms_up[col] = encode_phones(normalize_phones(bottoms_up[col]))
+
+    compact_bottoms_up(bottoms_up)
+    compact_bytes = bottoms_up.memory_usage(deep=True).sum()
+    logger(
+        f"Loaded {len(bottoms_up):,} bottoms_up rows: {compact_bytes / 2**20:,.0f} MB in memory "
+        f"(saved {(loaded_bytes - compact_bytes) / 2**20:,.0f} MB of {loaded_bytes / 2**20:,.0f} MB)"
+    )
+    return bottoms_up
+
+def parse_numeric_lossless(values):
+    """Parse a text column as numbers, or return it unchanged when any value
+    would not survive the round trip (e.g. "007", "1,200", "3.50")."""
+    if values.dtype != object:
+        return values
+    present = values.notna()
+    numbers = pd.to_numeric(values, errors="coerce")
+    if numbers[present].isna().any():
+        return values
+    if (numbers[present] % 1 == 0).all():
+        numbers = numbers.astype("Int64")
+    if not (numbers[present].astype(str) == values[present].astype(str)).all():
+        return values
+    return numbers
 
+def compact_bottoms_up(bottoms_up):
+    """Shrink the loaded table in place: dictionary-encode low-cardinality
+    columns and parse numeric text. date_created stays text: each output
+    parses it with the format its own first value implies, like the other
+    backends do."""
+    for col in category_cols:
+        if bottoms_up[col].nunique(dropna=True) < len(bottoms_up) * CATEGORY_MAX_RATIO:
+            bottoms_up[col] = bottoms_up[col].astype("category")
+    for col in numeric_cols:
+        bottoms_up[col] = parse_numeric_lossless(bottoms_up[col])
     return bottoms_up
 
 def normalize_phone(phone):
@@ -113,6 +254,30 @@ def normalize_phone(phone):
         digits = digits[1:]
     return digits
     
+def phone_key(digits):
+    """int64 key of a normalized phone: 0 for no phone, the number itself,
+    or -int("1" + digits) when it has leading zeros (so the key stays
+    lossless); -1 when it cannot be keyed (over 18 or non-ASCII digits)."""
+    if not digits:
+        return 0
+    if len(digits) > 18 or not (digits.isascii() and digits.isdigit()):
+        return -1
+    if digits[0] == "0":
+        return -int("1" + digits)
+    return int(digits)
+
+def encode_phones(phones):
+    """Vectorized phone_key over a Series of normalized phone strings."""
+    phones = phones.fillna('').astype(str)
+    codes = np.zeros(len(phones), dtype=np.int64)
+    keyable = phones.str.fullmatch(r"[0-9]{1,18}").to_numpy(dtype=bool)
+    leading_zero = keyable & phones.str.startswith('0').to_numpy(dtype=bool)
+    plain = keyable & ~leading_zero
+    codes[plain] = phones[plain].astype(np.int64).to_numpy()
+    codes[leading_zero] = -("1" + phones[leading_zero]).astype(np.int64).to_numpy()
+    codes[~keyable & (phones != '').to_numpy()] = -1
+    return pd.Series(codes, index=phones.index)
+
 # Helper function to separate by rows
 def separate_by_rows(df):
     if 'id' in df.columns:
@@ -123,25 +288,375 @@ def separate_by_rows(df):
         df = df.assign(**{'phone_number': df['phone_number'].astype(str).str.split(',')}).explode('phone_number')
     return df
 
-def get_matching_ids(bottoms_up_df, id=None, phone=None, sn=None):
-    results = []
-    if id:
-        id = id.upper().strip()
-        mask = (bottoms_up_df['id'] == id)
-        results.extend(bottoms_up_df.loc[mask, 'id'].dropna().unique().tolist())
+def read_input_file(file_path):
+    """Read an input file as text columns, or return None for unsupported types.
+
+    Parquet and Feather files keep their column types; only the key
+    columns are turned into text.
+    """
+    if file_path.endswith(".xlsx"):
+        return pd.read_excel(file_path, dtype=str)
+    elif file_path.endswith(".csv"):
+        return pd.read_csv(file_path, dtype=str)
+    elif file_path.endswith(".parquet"):
+        return key_cols_as_text(pd.read_parquet(file_path))
+    elif file_path.endswith(".feather"):
+        return key_cols_as_text(pd.read_feather(file_path))
+    return None
+
+def key_cols_as_text(df):
+    """Key columns of a typed input as the text a CSV read would give
+    (whole numbers without ".0"), with every kind of null as NaN."""
+    for col in key_cols:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+            values = values.astype("Int64")
+        df[col] = values.astype(str).astype(object).where(values.notna(), np.nan)
+    return df
+
+def prepare_input(df):
+    """Explode multi-value keys and normalize/filter the key column."""
+    df = separate_by_rows(df)
+
+    if 'phone_number' in df.columns:
+        df['phone_number'] = normalize_phones(df['phone_number'])
+    elif 'id' in df.columns:
+        df = df[df['id'].notna() & ~normalize_ids(df['id']).isin(['', 'NAN'])]
+    elif 'BTP SN' in df.columns:
+        df = df[df['BTP SN'].notna() & ~normalize_ids(df['BTP SN']).isin(['', 'NAN'])]
+        df['BTP SN'] = normalize_serials(df['BTP SN'])
+    return df
+
+def output_file_path(OUTPUT_FOLDER, filename, output_format=None):
+    """output_<name>.<ext> in OUTPUT_FOLDER: the input's format, or
+    output_format (one of OUTPUT_FORMATS) when given."""
+    name, ext = os.path.splitext(filename)
+    if output_format is not None:
+        ext = f".{output_format}"
+    return os.path.join(OUTPUT_FOLDER, f"output_{name}{ext}")
+
+def load_input_file(file_path, multi_key=False):
+    """Parse and prepare one input file, or return None for unsupported types.
+
+    With multi_key rows are left unexploded; enrich_frame_multi splits the
+    keys of every key column itself.
+    """
+    df = read_input_file(file_path)
+    if df is None or multi_key:
+        return df
+    return prepare_input(df)
+
+def count_csv_rows(file_path):
+    """Cheap data-row count (lines minus the header) used for progress."""
+    lines = 0
+    last = b"\n"
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+def infer_date_format(values):
+    """Return the format pd.to_datetime would infer for values, "mixed" when it
+    falls back to per-element parsing, or None if every value is empty.
+
+    Mirrors pandas: the first non-empty element decides.
+    """
+    for value in values:
+        if value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+            continue
+        if type(value) is str:
+            if value in ("", "NaT", "nat", "NAT", "nan", "NaN", "NAN"):
+                continue
+            return guess_datetime_format(value) or "mixed"
+        return "mixed"
+    return None
+
+def format_output(output_df, date_format=None):
+    """Apply the output-only formatting (date_created as YYYY-MM-DD)."""
+    if "date_created" in output_df.columns:
+        output_df["date_created"] = pd.to_datetime(
+            output_df["date_created"], errors="coerce", format=date_format
+        ).dt.strftime("%Y-%m-%d").fillna("")
+    return output_df
+
+def typed_output(output_df, date_format=None, fixed=False):
+    """format_output for columnar outputs: date_created as a datetime,
+    numeric_cols as (nullable) numbers, integer_cols as nullable integers
+    and the other enrichment columns as text, with the blanks of unmatched
+    rows as nulls. A numeric or integer column with values that are not
+    numbers (or not whole numbers) stays text.
+
+    fixed: for streamed outputs, whose chunks must all share one schema.
+    Every chunk then gets the same types whatever its values:
+    numeric_cols as Float64, integer_cols as Int64 (values that are not
+    numbers, or not whole numbers, become nulls), the other enrichment
+    columns as text.
+    """
+    for col in enrich_cols + [MATCHED_BY_COL]:
+        if col not in output_df.columns:
+            continue
+        if col == "date_created":
+            output_df[col] = pd.to_datetime(output_df[col], errors="coerce", format=date_format)
+            continue
+        if pd.api.types.is_numeric_dtype(output_df[col]) and not fixed and col not in integer_cols:
+            continue
+        values = output_df[col].to_numpy(dtype=object)
+        blank = pd.isna(values) | (values == "")
+        if col in numeric_cols or col in integer_cols:
+            numbers = pd.to_numeric(pd.Series(np.where(blank, None, values)), errors="coerce")
+            if fixed:
+                if col in integer_cols:
+                    numbers = numbers.where(numbers % 1 == 0)
+                output_df[col] = numbers.astype("Int64" if col in integer_cols else "Float64").array
+                continue
+            if numbers.notna().sum() == (~blank).sum():
+                integral = (numbers.dropna() % 1 == 0).all()
+                if integral or col in numeric_cols:
+                    output_df[col] = numbers.astype("Int64" if integral else "Float64").array
+                    continue
+        if pd.api.types.infer_dtype(values[~blank], skipna=False) not in ("string", "empty"):
+            values = np.array([str(v) for v in values], dtype=object)
+        values[blank] = None
+        output_df[col] = values
+    return output_df
+
+def finish_output(output_df, output_path, date_format=None, streamed=False):
+    """Output formatting for the format of output_path (streamed: one chunk
+    of an output written in several)."""
+    if output_path.endswith(COLUMNAR_EXTENSIONS):
+        return typed_output(output_df, date_format=date_format, fixed=streamed)
+    return format_output(output_df, date_format=date_format)
+
+def write_output_file(output_df, output_path):
+    """Write an enriched frame in the format given by the output path.
+
+    Excel outputs past the sheet row limit are split across sheets.
+    """
+    output_df = finish_output(output_df, output_path)
+    if output_path.endswith(".parquet"):
+        output_df.to_parquet(output_path, index=False)
+    elif output_path.endswith(".feather"):
+        output_df.reset_index(drop=True).to_feather(output_path)
+    elif output_path.endswith(".xlsx"):
+        if len(output_df) < EXCEL_MAX_ROWS:
+            output_df.to_excel(output_path, index=False)
+        else:
+            writer = open_output_stream(output_path)
+            writer.write(output_df)
+            writer.close()
+    else:
+        output_df.to_csv(output_path, index=False)
+
+def count_input_rows(file_path):
+    """Cheap data-row count of an input file, used for progress."""
+    if file_path.endswith(".xlsx"):
+        return count_excel_rows(file_path)
+    if file_path.endswith(COLUMNAR_EXTENSIONS):
+        return count_columnar_rows(file_path)
+    return count_csv_rows(file_path)
+
+def read_input_columns(file_path):
+    if file_path.endswith(".xlsx"):
+        return next(iter_excel_chunks(file_path, 1)).columns
+    if file_path.endswith(COLUMNAR_EXTENSIONS):
+        return read_columnar_columns(file_path)
+    return pd.read_csv(file_path, dtype=str, nrows=0).columns
+
+def iter_input_chunks(file_path, chunk_rows, logger=None):
+    """Yield an input file as frames of up to chunk_rows rows, read the way
+    read_input_file reads it (raw text, or typed with text key columns)."""
+    if file_path.endswith(".xlsx"):
+        return iter_excel_chunks(file_path, chunk_rows, logger=logger)
+    if file_path.endswith(COLUMNAR_EXTENSIONS):
+        return map(key_cols_as_text, iter_columnar_chunks(file_path, chunk_rows))
+    return pd.read_csv(file_path, dtype=str, chunksize=chunk_rows)
+
+def concat_ranges(starts, counts):
+    """Concatenated ranges start .. start + count."""
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(ends[-1] if len(ends) else 0)
+
+class BottomsUpIndex:
+    """Hash lookups over the loaded bottoms_up table.
+
+    Built once after load_bottoms_up_db so every key lookup is a hash or
+    binary-search hit instead of a scan over the whole table. Enrichment
+    values are gathered from the table by row position rather than copied.
+    """
+
+    def __init__(self, bottoms_up):
+        self.bottoms_up = bottoms_up
+        self._enrich_positions = [bottoms_up.columns.get_loc(col) for col in enrich_cols]
+
+        # id -> position of the first row carrying that id
+        self.id_to_row = {}
+        for pos, row_id in enumerate(bottoms_up['id'].tolist()):
+            if row_id not in self.id_to_row:
+                self.id_to_row[row_id] = pos
+
+        # (key, id) frames sorted by key: phone1-phone5 as int64 phone keys,
+        # Serial Number as text
+        phones = pd.concat([
+            pd.DataFrame({
+                'key': bottoms_up[col] if pd.api.types.is_integer_dtype(bottoms_up[col])
+                else encode_phones(bottoms_up[col]),  # raw frames from older callers
+                'id': bottoms_up['id'],
+            })
+            for col in phone_cols
+        ])
+        serials = bottoms_up[['Serial Number', 'id']].set_axis(['key', 'id'], axis=1)
+        self.key_frames = {
+            'phone_number': phones[~phones['key'].isin([0, -1])].drop_duplicates().sort_values('key', kind='stable'),
+            'BTP SN': serials[serials['key'].map(lambda sn: isinstance(sn, str))]
+                .drop_duplicates().sort_values('key', kind='stable'),
+        }
+        for key_col, frame in self.key_frames.items():
+            self.key_frames[key_col] = frame.reset_index(drop=True)
+
+        # contact_group_id closure: an id belongs to the first non-empty group
+        # it appears with; a group's members are laid out contiguously (in
+        # bottoms_up order) so expanding a match is a slice
+        groups = bottoms_up[['id', 'contact_group_id']].dropna(subset=['contact_group_id'])
+        id_groups = groups.drop_duplicates('id')
+        self.id_to_group = dict(zip(id_groups['id'].tolist(), id_groups['contact_group_id'].tolist()))
+
+        members = groups.drop_duplicates()
+        member_pos = members['id'].map(self.id_to_row).to_numpy()
+        group_codes, group_values = pd.factorize(members['contact_group_id'])
+        order = np.lexsort((member_pos, group_codes))
+        self._member_rows = member_pos[order]
+        self._member_ids = members['id'].to_numpy(dtype=object)[order]
+
+        sorted_codes = group_codes[order]
+        bounds = np.flatnonzero(np.diff(sorted_codes)) + 1
+        starts = np.concatenate(([0], bounds)).tolist() if len(sorted_codes) else []
+        stops = np.concatenate((bounds, [len(sorted_codes)])).tolist() if len(sorted_codes) else []
+        self.group_slices = {
+            group_values[code]: (start, stop)
+            for code, start, stop in zip(sorted_codes[starts].tolist(), starts, stops)
+        }
+
+    def __len__(self):
+        return len(self.bottoms_up)
+
+    def to_state(self):
+        """Plain dict of the index contents, for the on-disk cache."""
+        return dict(vars(self))
+
+    @classmethod
+    def from_state(cls, state):
+        bottoms_up_index = cls.__new__(cls)
+        bottoms_up_index.__dict__.update(state)
+        return bottoms_up_index
+
+    def get_row(self, id):
+        """Return the first bottoms_up row for an id, or None if it is unknown."""
+        pos = self.id_to_row.get(id)
+        if pos is None:
+            return None
+        return self.bottoms_up.iloc[pos]
+
+    def _find(self, key_col, keys):
+        """(index into keys, match count, matched ids) of every key found,
+        by binary search over the sorted key frame."""
+        frame = self.key_frames[key_col]
+        sorted_keys = frame['key'].to_numpy()
+        starts = sorted_keys.searchsorted(keys, side='left')
+        counts = sorted_keys.searchsorted(keys, side='right') - starts
+        found = np.flatnonzero(counts)
+        ids = frame['id'].to_numpy(dtype=object)[concat_ranges(starts[found], counts[found])]
+        return found, counts[found], ids
+
+    def _ids_for_key(self, key_col, key):
+        _, _, ids = self._find(key_col, np.array([key], dtype=object if key_col == 'BTP SN' else np.int64))
+        return ids.tolist()
+
+    def match(self, id=None, phone=None, sn=None):
+        results = set()
+        if id:
+            id = id.upper().strip()
+            if id in self.id_to_row:
+                results.add(id)
+
+        if phone:
+            phone = phone_key(phone.upper().strip())
+            if phone not in (0, -1):
+                results.update(self._ids_for_key('phone_number', phone))
 
-    if phone:
-        phone = phone.upper().strip()
-        mask = bottoms_up_df[phone_cols].eq(phone).any(axis=1)
-        results.extend(bottoms_up_df.loc[mask, 'id'].dropna().unique().tolist())
+        if sn:
+            sn = sn.upper().strip()
+            results.update(self._ids_for_key('BTP SN', sn))
 
-    if sn:
-        sn = sn.upper().strip()
-        mask = (bottoms_up_df['Serial Number'] == sn)
-        results.extend(bottoms_up_df.loc[mask, 'id'].dropna().unique().tolist())
+        return list(results)
 
-    # remove duplicates
-    return list(set(results))
+    # Backend interface used by enrich_frame (shared with SqliteLookup)
+    def match_keys(self, key_col, keys):
+        """Return (key, id) pairs for the given normalized keys."""
+        if key_col == 'id':
+            found = [key for key in keys if key in self.id_to_row]
+            return pd.DataFrame({'key': found, 'id': found}, dtype=object)
+        keys = np.asarray(keys, dtype=object)
+        if key_col == 'phone_number':
+            codes = encode_phones(pd.Series(keys, dtype=object)).to_numpy()
+            keyed = np.flatnonzero((codes != 0) & (codes != -1))
+            found, counts, ids = self._find(key_col, codes[keyed])
+            found = keyed[found]
+        elif key_col == 'BTP SN':
+            found, counts, ids = self._find(key_col, keys)
+        else:
+            raise ValueError(f"Unknown key column: {key_col}")
+        return pd.DataFrame({'key': np.repeat(keys[found], counts), 'id': ids})
+
+    def _group_members(self, groups):
+        """(member count, member ids) of every group, each group's members
+        in bottoms_up order; a slice per group, never a scan."""
+        slices = np.array([self.group_slices.get(group, (0, 0)) for group in groups], dtype=np.int64).reshape(-1, 2)
+        counts = slices[:, 1] - slices[:, 0]
+        return counts, self._member_ids[concat_ranges(slices[:, 0], counts)]
+
+    def group_pairs(self, ids):
+        """Return (id, member_id) pairs linking ids to every member of their contact group."""
+        pairs = self.id_group_pairs(ids)
+        counts, members = self._group_members(pairs['contact_group_id'].tolist())
+        return pd.DataFrame({'id': np.repeat(pairs['id'].to_numpy(dtype=object), counts), 'member_id': members})
+
+    def id_group_pairs(self, ids):
+        """Return (id, contact_group_id) for the ids that belong to a contact group."""
+        grouped = [(id, self.id_to_group[id]) for id in ids if id in self.id_to_group]
+        return pd.DataFrame(grouped, columns=['id', 'contact_group_id'], dtype=object)
+
+    def group_member_pairs(self, groups):
+        """Return (contact_group_id, member_id) for every member of the given groups."""
+        groups = list(groups)
+        counts, members = self._group_members(groups)
+        return pd.DataFrame({
+            'contact_group_id': np.repeat(np.array(groups, dtype=object), counts), 'member_id': members
+        })
+
+    def get_records(self, ids):
+        """Return the enrichment columns and bottoms_up position of each known id."""
+        positions = [self.id_to_row[id] for id in ids if id in self.id_to_row]
+        records = self.bottoms_up.iloc[positions, self._enrich_positions].reset_index(drop=True)
+        records['_pos'] = positions
+        return records
+
+    def group_ids(self, group):
+        """Return the member ids of a contact group, in bottoms_up order."""
+        start, stop = self.group_slices.get(group, (0, 0))
+        return self._member_ids[start:stop].tolist()
+
+
+
+def get_matching_ids(bottoms_up_index, id=None, phone=None, sn=None):
+    # Accept a raw DataFrame for older callers, at the cost of indexing it here
+    if isinstance(bottoms_up_index, pd.DataFrame):
+        bottoms_up_index = BottomsUpIndex(bottoms_up_index)
+    return bottoms_up_index.match(id=id, phone=phone, sn=sn)
 
 
 # Helper function to get owner data
@@ -149,175 +664,1898 @@ def enrich_row(row, matched_row=None):
     """Return a new row enriched with bottoms_up data if matched_row is given,
        otherwise fill enrichment columns with blanks."""
     new_row = row.copy()
-    cols_to_copy = [
-        "id", "date_created", "Owner", "Input: Address", "Input: City", "Input: State",
-        "County", "State", "Contact Type", "# of Interests", "contact_group_id",
-        "is_latest_offer", "Category", "Total Value - Low ($)",
-        "md_address", "md_city", "md_state"
-    ]
-    for col in cols_to_copy:
+    for col in enrich_cols:
         if matched_row is not None:
             new_row[col] = matched_row.get(col, "")
         else:
             new_row[col] = ""
     return new_row
 
+def resolve_keys(lookup, key_col, keys, report=None):
+    """Return distinct (key, id) pairs for normalized keys: the ids each key
+    matches plus every id sharing their contact_group_id."""
+    if report is None:
+        report = RunReport()
+    with report.phase("match"):
+        matches = lookup.match_keys(key_col, keys)
+
+    # Expand ids using contact_group_id
+    with report.phase("group expansion"):
+        pairs = lookup.group_pairs(matches['id'].unique())
+        expanded = matches.merge(pairs, on='id')[['key', 'member_id']].rename(columns={'member_id': 'id'})
+        return pd.concat([matches[['key', 'id']], expanded]).drop_duplicates()
+
+class MatchMemo:
+    """Memoized resolve_keys: each distinct key is matched and group-expanded
+    against the lookup once, however many rows, batches or files use it.
+
+    plan_frame() resolves the keys of each parsed file in large batches
+    before its rows are matched; keys first seen later (streamed chunks)
+    are resolved on demand.
+    """
+
+    def __init__(self, lookup, plan_batch_keys=PLAN_BATCH_KEYS):
+        self.lookup = lookup
+        self.plan_batch_keys = plan_batch_keys
+        self.key_ids = {key_col: {} for key_col in key_cols}
+
+    def __len__(self):
+        return sum(len(known) for known in self.key_ids.values())
+
+    def _resolve_new(self, key_col, keys, report):
+        known = self.key_ids[key_col]
+        resolved = resolve_keys(self.lookup, key_col, keys, report)
+        # ids of each key as one tuple, grouped with a stable sort instead of
+        # a per-key groupby
+        codes, uniques = pd.factorize(resolved['key'])
+        ids = resolved['id'].to_numpy(dtype=object)[np.argsort(codes, kind='stable')]
+        bounds = np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1]
+        known.update(zip(uniques, map(tuple, np.split(ids, bounds))))
+        for key in keys:
+            known.setdefault(key, ())
+
+    def plan(self, key_col, keys, report=None):
+        """Resolve the distinct keys not memoized yet, in batches."""
+        if report is None:
+            report = RunReport()
+        known = self.key_ids[key_col]
+        new = [key for key in dict.fromkeys(keys) if key not in known]
+        for start in range(0, len(new), self.plan_batch_keys):
+            self._resolve_new(key_col, new[start:start + self.plan_batch_keys], report)
+        report.memo["planned_keys"] += len(new)
+
+    def plan_frame(self, df, key_col, report=None):
+        """plan() the keys of a prepared frame's key column (or list of them)."""
+        if isinstance(key_col, list):
+            for col, keys in multi_key_rows(df, key_col).groupby('key_col')['key']:
+                self.plan(col, keys.unique().tolist(), report)
+        else:
+            keys = normalize_ids(df[key_col].fillna(''))
+            self.plan(key_col, keys[keys != ''].unique().tolist(), report)
+
+    def resolve(self, key_col, keys, report=None):
+        """resolve_keys served from the memo (keys must be distinct)."""
+        if report is None:
+            report = RunReport()
+        known = self.key_ids[key_col]
+        new = [key for key in keys if key not in known]
+        if new:
+            self._resolve_new(key_col, new, report)
+        report.memo["key_lookups"] += len(keys)
+        report.memo["memo_hits"] += len(keys) - len(new)
+        report.memo["resolved_keys"] += len(new)
+
+        ids = [known[key] for key in keys]
+        lengths = np.fromiter(map(len, ids), dtype=np.int64, count=len(ids))
+        return pd.DataFrame({
+            'key': np.repeat(np.asarray(keys, dtype=object), lengths),
+            'id': np.fromiter(chain.from_iterable(ids), dtype=object, count=int(lengths.sum())),
+        })
+
+def cap_fanout(matched, max_row_fanout, report):
+    """Keep the first max_row_fanout matches (in bottoms_up order) of every
+    row of a (_row, _pos, ...) match frame; None keeps them all."""
+    if max_row_fanout is None:
+        return matched
+    matched = matched.sort_values(['_row', '_pos'], kind='stable')
+    keep = matched.groupby('_row', sort=False).cumcount().to_numpy() < max_row_fanout
+    if keep.all():
+        return matched
+    dropped = matched['_row'].to_numpy()[~keep]
+    report.count_capped(len(np.unique(dropped)), len(dropped))
+    return matched[keep]
+
+def enrich_frame(df, lookup, key_col, report=None, memo=None, max_row_fanout=None):
+    """Vectorized enrich_row over a whole input frame.
+
+    Keys are matched, expanded through contact_group_id and joined to the
+    enrichment columns with merges against the lookup backend (BottomsUpIndex
+    or SqliteLookup), or served from a MatchMemo when one is given. Every
+    input row yields one row per matched id (in bottoms_up order, at most
+    max_row_fanout of them), or one blank-enriched row if nothing matched.
+    Match and group-expansion timings and hit counts go to report.
+    """
+    if report is None:
+        report = RunReport()
+
+    with report.phase("match"):
+        keys = normalize_ids(df[key_col].fillna(''))
+        rows = pd.DataFrame({'_row': np.arange(len(df)), 'key': keys.to_numpy()})
+        rows = rows[rows['key'] != '']
+
+    if memo is not None:
+        resolved = memo.resolve(key_col, rows['key'].unique().tolist(), report)
+    else:
+        resolved = resolve_keys(lookup, key_col, rows['key'].unique(), report)
+
+    with report.phase("group expansion"):
+        matched = rows.merge(resolved, on='key')[['_row', 'id']]
+        matched = matched.merge(lookup.get_records(matched['id'].unique()), on='id')
+
+    ids_per_row = np.bincount(matched['_row'].to_numpy(dtype=np.int64), minlength=len(df))
+    report.count_matches(key_col, len(df) - len(rows), ids_per_row[rows['_row'].to_numpy()])
+    matched = cap_fanout(matched, max_row_fanout, report)
+    if SHARD_COL in matched:
+        report.count_shards(matched[SHARD_COL])
+
+    # Always include unmatched rows, just blank enrichment columns
+    unmatched_rows = np.setdiff1d(np.arange(len(df)), matched['_row'].to_numpy())
+    parts = [matched]
+    if len(unmatched_rows):
+        unmatched = pd.DataFrame({'_row': unmatched_rows, '_pos': -1})
+        for col in enrich_cols:
+            unmatched[col] = ""
+        parts.append(unmatched)
+    out = pd.concat(parts).sort_values(['_row', '_pos'], kind='stable')
+
+    enriched = df.iloc[out['_row'].to_numpy()].copy()
+    for col in enrich_cols:
+        enriched[col] = out[col].to_numpy()
+    return enriched
+
+def multi_key_rows(df, match_cols):
+    """(_row, key, key_col) for every key of every key column of df.
+
+    Each column is exploded, filtered and normalized exactly as
+    prepare_input / enrich_frame do for a single key column; _row is the
+    row's position in df.
+    """
+    parts = []
+    for key_col in match_cols:
+        prepared = prepare_input(df[[key_col]].set_axis(np.arange(len(df))))
+        keys = normalize_ids(prepared[key_col].fillna(''))
+        part = pd.DataFrame({'_row': prepared.index.to_numpy(dtype=np.int64), 'key': keys.to_numpy(),
+                             'key_col': key_col})
+        parts.append(part[part['key'] != ''])
+    return pd.concat(parts, ignore_index=True)
+
+def enrich_frame_multi(df, lookup, match_cols, report=None, memo=None, max_row_fanout=None):
+    """enrich_frame matching every key column in match_cols in one pass.
+
+    Rows are not exploded: the ids matched by any key of any column are
+    unioned per row before group expansion, and each output row records in
+    MATCHED_BY_COL which key column(s) led to its id.
+    """
+    if report is None:
+        report = RunReport()
+
+    with report.phase("match"):
+        rows = multi_key_rows(df, match_cols)
+
+    parts = []
+    for bit, key_col in enumerate(match_cols):
+        col_rows = rows[rows['key_col'] == key_col]
+        keys = col_rows['key'].unique()
+        if memo is not None:
+            resolved = memo.resolve(key_col, keys.tolist(), report)
+        else:
+            resolved = resolve_keys(lookup, key_col, keys, report)
+        matched = col_rows.merge(resolved, on='key')[['_row', 'id']].drop_duplicates()
+        matched['_by'] = 1 << bit
+        parts.append(matched)
+
+        keyed_rows = col_rows['_row'].unique()
+        ids_per_row = np.bincount(matched['_row'].to_numpy(dtype=np.int64), minlength=len(df))
+        report.count_matches(key_col, len(df) - len(keyed_rows), ids_per_row[keyed_rows], fanout=False)
+
+    with report.phase("group expansion"):
+        matched = pd.concat(parts).groupby(['_row', 'id'], as_index=False, sort=False)['_by'].sum()
+        labels = {
+            code: MATCHED_BY_SEP.join(c for bit, c in enumerate(match_cols) if code & (1 << bit))
+            for code in range(1, 1 << len(match_cols))
+        }
+        matched[MATCHED_BY_COL] = matched.pop('_by').map(labels)
+        matched = matched.merge(lookup.get_records(matched['id'].unique()), on='id')
+
+    ids_per_row = np.bincount(matched['_row'].to_numpy(dtype=np.int64), minlength=len(df))
+    report.count_fanout(ids_per_row)
+    matched = cap_fanout(matched, max_row_fanout, report)
+    if SHARD_COL in matched:
+        report.count_shards(matched[SHARD_COL])
+
+    unmatched_rows = np.setdiff1d(np.arange(len(df)), matched['_row'].to_numpy())
+    parts = [matched]
+    if len(unmatched_rows):
+        unmatched = pd.DataFrame({'_row': unmatched_rows, '_pos': -1})
+        for col in enrich_cols + [MATCHED_BY_COL]:
+            unmatched[col] = ""
+        parts.append(unmatched)
+    out = pd.concat(parts).sort_values(['_row', '_pos'], kind='stable')
+
+    enriched = df.iloc[out['_row'].to_numpy()].copy()
+    for col in enrich_cols + [MATCHED_BY_COL]:
+        enriched[col] = out[col].to_numpy()
+    return enriched
+
+def enrich_batch(df, lookup, key_col, report=None, memo=None, max_row_fanout=None):
+    """enrich_frame for one key column, enrich_frame_multi for a list of them."""
+    if isinstance(key_col, list):
+        return enrich_frame_multi(df, lookup, key_col, report=report, memo=memo, max_row_fanout=max_row_fanout)
+    return enrich_frame(df, lookup, key_col, report=report, memo=memo, max_row_fanout=max_row_fanout)
+
+def file_key_cols(columns, multi_key=False):
+    """Key columns a file is matched on: the first of key_cols it has, or
+    with multi_key all of them (a list, even when only one is present)."""
+    present_cols = [c for c in key_cols if c in columns]
+    if not present_cols:
+        return None
+    return present_cols if multi_key else present_cols[0]
+
+# ----------------------- INDEX CACHE -----------------------
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_fingerprint(path):
+    """Size, mtime and content hash identifying one version of a file
+    (a .db file, or an input file in the run manifest)."""
+    stat = os.stat(path)
+    return {
+        "name": os.path.basename(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(path),
+    }
+
+def fingerprint_matches(fingerprint, path):
+    """True when path still has the content described by fingerprint.
+
+    Size is checked first; when only the mtime moved (the file was touched
+    or copied over) the content hash decides.
+    """
+    stat = os.stat(path)
+    if fingerprint["name"] != os.path.basename(path) or fingerprint["size"] != stat.st_size:
+        return False
+    return fingerprint["mtime_ns"] == stat.st_mtime_ns or fingerprint["sha256"] == file_sha256(path)
+
+def read_index_cache(cache_path, db_path, logger=print):
+    """Return (BottomsUpIndex, cached fingerprint) for db_path, or None if the
+    cache is missing or stale (see fingerprint_matches).
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "rb") as f:
+            header = pickle.load(f)
+            if header.get("version") != INDEX_CACHE_VERSION:
+                return None
+            cached = header["fingerprint"]
+            if not fingerprint_matches(cached, db_path):
+                return None
+            return BottomsUpIndex.from_state(pickle.load(f)), cached
+    except Exception as e:
+        logger(f"Ignoring unreadable index cache {cache_path}: {e}")
+        return None
+
+def write_index_cache(cache_path, fingerprint, bottoms_up_index, logger=print):
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": INDEX_CACHE_VERSION, "fingerprint": fingerprint}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(bottoms_up_index.to_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        # the cache is only an accelerator, never fail a run over it
+        logger(f"Could not write index cache {cache_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_bottoms_up_index(BOTTOMS_UP_FOLDER, logger=print, use_cache=True, report=None, db_path=None):
+    """Return a BottomsUpIndex for the database in BOTTOMS_UP_FOLDER (or
+    for the shard db_path).
+
+    With use_cache, the index is read from the sidecar cache next to the .db
+    file when it matches the database, and rebuilt and re-cached otherwise.
+    """
+    cache_path = db_sidecar_path(BOTTOMS_UP_FOLDER, INDEX_CACHE_NAME, db_path)
+    shard_path = db_path
+    db_path = db_path or find_bottoms_up_db(BOTTOMS_UP_FOLDER, logger=logger)
+
+    if use_cache:
+        cached = read_index_cache(cache_path, db_path, logger=logger)
+        if cached is not None:
+            bottoms_up_index, fingerprint = cached
+            logger("Loaded bottoms_up index from cache.")
+            mtime_ns = os.stat(db_path).st_mtime_ns
+            if fingerprint["mtime_ns"] != mtime_ns:
+                # same content under a new mtime: record it to skip rehashing next time
+                write_index_cache(cache_path, dict(fingerprint, mtime_ns=mtime_ns), bottoms_up_index, logger=logger)
+            return bottoms_up_index
+        fingerprint = file_fingerprint(db_path)
+
+    bottoms_up_index = BottomsUpIndex(
+        load_bottoms_up_db(BOTTOMS_UP_FOLDER, logger=logger, report=report, db_path=shard_path)
+    )
+
+    if use_cache:
+        write_index_cache(cache_path, fingerprint, bottoms_up_index, logger=logger)
+    return bottoms_up_index
+
+# ----------------------- RUN MANIFEST -----------------------
+class RunManifest:
+    """Record of the files a previous run finished, kept in the output folder.
+
+    A file is skipped when its content, the database and the output
+    settings all match the record and its output is still in place.
+    Entries are saved as soon as each file's output is written, so an
+    interrupted run resumes at the first unfinished file.
+    """
+
+    def __init__(self, OUTPUT_FOLDER, db_paths, settings, logger=print):
+        self.path = os.path.join(OUTPUT_FOLDER, RUN_MANIFEST_NAME)
+        self.settings = settings
+        self.logger = logger
+        self.files = {}
+
+        # the .db file, or every shard of a sharded database
+        previous = self._read()
+        recorded = None if previous is None else previous.get("database")
+        if isinstance(recorded, dict):
+            recorded = [recorded]  # written before shards were supported
+        if (recorded is not None and previous.get("settings") == settings and len(recorded) == len(db_paths)
+                and all(map(fingerprint_matches, recorded, db_paths))):
+            self.files = previous["files"]
+            self.database = [
+                dict(fingerprint, mtime_ns=os.stat(db_path).st_mtime_ns)
+                for fingerprint, db_path in zip(recorded, db_paths)
+            ]
+        else:
+            self.database = [file_fingerprint(db_path) for db_path in db_paths]
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != RUN_MANIFEST_VERSION:
+                return None
+            return manifest
+        except (OSError, ValueError, KeyError) as e:
+            self.logger(f"Ignoring unreadable run manifest {self.path}: {e}")
+            return None
+
+    def pending(self, files, INPUT_FOLDER):
+        """The files that still need processing, in the given order."""
+        output_folder = os.path.dirname(self.path)
+        return [
+            f for f in files
+            if not self.is_done(f, os.path.join(INPUT_FOLDER, f),
+                                output_file_path(output_folder, f, self.settings.get("output_format")))
+        ]
+
+    def is_done(self, filename, input_path, output_path):
+        entry = self.files.get(filename)
+        if entry is None or not fingerprint_matches(entry["input"], input_path):
+            return False
+        if entry["output_size"] is None:
+            return True
+        # the output-size guard may have written it in another format
+        output_path = os.path.join(os.path.dirname(output_path), entry["output"])
+        return os.path.exists(output_path) and os.path.getsize(output_path) == entry["output_size"]
+
+    def record(self, filename, input_path, output_path):
+        """Mark a file finished (after its output was written) and save."""
+        self.files[filename] = {
+            "input": file_fingerprint(input_path),
+            "output": os.path.basename(output_path),
+            "output_size": os.path.getsize(output_path) if os.path.exists(output_path) else None,
+        }
+        self.save()
+
+    def prune(self, filenames):
+        """Drop entries of input files that are gone."""
+        self.files = {name: entry for name, entry in self.files.items() if name in filenames}
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": RUN_MANIFEST_VERSION,
+                    "database": self.database,
+                    "settings": self.settings,
+                    "files": self.files,
+                }, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # the manifest only saves work on reruns, never fail a run over it
+            self.logger(f"Could not write run manifest {self.path}: {e}")
+
+def output_settings(multi_key=False, output_format=None, max_row_fanout=None, backend="memory", db_paths=()):
+    """Settings that shape output contents; changing any reprocesses every file.
+
+    shards names the .db files of a sharded database (db_paths), whose
+    outputs carry SHARD_COL; None for a single .db file.
+    """
+    shards = [os.path.basename(db_path) for db_path in db_paths] if len(db_paths) > 1 else None
+    return {"key_cols": list(key_cols), "enrich_cols": list(enrich_cols), "multi_key": multi_key,
+            "output_format": output_format, "max_row_fanout": max_row_fanout, "backend": backend, "shards": shards}
+
+# ----------------------- SQL PUSH-DOWN -----------------------
+def sqlite_uri(path, mode="ro"):
+    """file: URI opening an SQLite file in the given mode."""
+    return f"{pathlib.Path(os.path.abspath(path)).as_uri()}?mode={mode}"
+
+class SqliteLookup:
+    """Lookup backend that leaves bottoms_up in SQLite and queries it by key.
+
+    Only the distinct keys of the file being processed are resolved, with
+    batched WHERE ... IN (...) queries, so memory stays flat regardless of
+    the database size. The .db file is only ever opened read-only: the
+    normalized ids and phones (the two key columns load_bottoms_up_db
+    rewrites in Python), serial numbers and contact groups are indexed on
+    first use in a separate key database (keys_path) that is attached to
+    every query. When that file cannot be written the queries run
+    unindexed against the database instead.
+    """
+
+    KEYS_TABLE = "bottoms_up_keys"
+    GROUPS_TABLE = "bottoms_up_groups"
+    META_TABLE = "bottoms_up_keys_meta"
+    KEYS_VERSION = 2
+    QUERY_BATCH = 500
+    BUILD_CHUNK_ROWS = 100_000
+
+    def __init__(self, db_path, keys_path=None, logger=print):
+        self.db_path = db_path
+        self.keys_path = None
+        with closing(self._connect()) as conn:
+            table_cols = [row[1] for row in conn.execute("PRAGMA table_info(bottoms_up)")]
+            missing_cols = [c for c in bottoms_up_cols if c not in table_cols]
+            if missing_cols:
+                logger(f"❌ Database error: Missing required columns {missing_cols}")
+                raise RuntimeError(f"Database error: Missing required columns {missing_cols}")
+            self.float_cols = self._open_keys(conn, keys_path, logger)
+
+    def _connect(self):
+        conn = sqlite3.connect(sqlite_uri(self.db_path), uri=True)
+        # normalize_ids / normalize_phone for one value, for unindexed queries
+        conn.create_function("normalize_id", 1, lambda value: str(value).upper().strip(), deterministic=True)
+        conn.create_function("normalize_phone", 1, normalize_phone, deterministic=True)
+        if self.keys_path is not None:
+            conn.execute("ATTACH DATABASE ? AS keys", (sqlite_uri(self.keys_path),))
+        return conn
+
+    def _open_keys(self, conn, keys_path, logger=print):
+        """Use the key database at keys_path, building it unless it matches
+        the .db file; returns the float columns (see _float_cols)."""
+        if keys_path is None:
+            return self._float_cols(conn)
+        meta = self._read_keys_meta(keys_path)
+        if meta is not None and meta[0] == self.KEYS_VERSION and fingerprint_matches(json.loads(meta[1]), self.db_path):
+            self.keys_path = keys_path
+            return [c for c in meta[2].split("|") if c]
+
+        logger("Indexing bottoms_up keys next to the database (first run only)...")
+        tmp_path = keys_path + ".tmp"
+        try:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            float_cols = self._build_keys(conn, tmp_path)
+            os.replace(tmp_path, keys_path)
+        except (OSError, sqlite3.Error) as e:
+            # read-only folder: still answer every lookup, just slower
+            logger(f"Could not write the key index {keys_path} ({e}); querying the database unindexed.")
+            try:
+                conn.rollback()
+                conn.execute("DETACH DATABASE keys")
+            except sqlite3.Error:
+                pass
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return self._float_cols(conn)
+        self.keys_path = keys_path
+        return float_cols
+
+    def _read_keys_meta(self, keys_path):
+        if not os.path.exists(keys_path):
+            return None
+        try:
+            with closing(sqlite3.connect(sqlite_uri(keys_path), uri=True)) as conn:
+                return conn.execute(f"SELECT version, fingerprint, float_cols FROM {self.META_TABLE}").fetchone()
+        except sqlite3.Error:
+            return None
+
+    def _build_keys(self, conn, tmp_path):
+        """Write the normalized key tables and their indexes to tmp_path."""
+        fingerprint = file_fingerprint(self.db_path)
+        conn.execute("ATTACH DATABASE ? AS keys", (sqlite_uri(tmp_path, "rwc"),))
+        conn.execute(f"CREATE TABLE keys.{self.KEYS_TABLE} (kind TEXT, key TEXT, id TEXT, row INTEGER)")
+        # untyped, so group ids keep the storage class they have in bottoms_up
+        conn.execute(f"CREATE TABLE keys.{self.GROUPS_TABLE} (contact_group_id, row INTEGER)")
+
+        phone_select = ", ".join(f"CAST({col} AS TEXT) AS {col}" for col in phone_cols)
+        chunks = pd.read_sql_query(
+            f"SELECT rowid AS row, id, {phone_select} FROM bottoms_up ORDER BY rowid",
+            conn, chunksize=self.BUILD_CHUNK_ROWS
+        )
+        for chunk in chunks:
+            ids = normalize_ids(chunk['id'])
+            parts = [pd.DataFrame({'kind': 'id', 'key': ids, 'id': ids, 'row': chunk['row']})]
+            for col in phone_cols:
+                phones = normalize_phones(chunk[col])
+                parts.append(pd.DataFrame({'kind': 'phone', 'key': phones, 'id': ids, 'row': chunk['row']})[phones != ''])
+            keys = pd.concat(parts)
+            conn.executemany(
+                f"INSERT INTO keys.{self.KEYS_TABLE} VALUES (?, ?, ?, ?)",
+                keys.itertuples(index=False, name=None)
+            )
+        conn.execute(
+            f"INSERT INTO keys.{self.KEYS_TABLE} (kind, key, row) SELECT 'serial', [Serial Number], rowid "
+            "FROM bottoms_up WHERE typeof([Serial Number]) = 'text'"
+        )
+        conn.execute(
+            f"INSERT INTO keys.{self.GROUPS_TABLE} SELECT contact_group_id, rowid "
+            "FROM bottoms_up WHERE contact_group_id IS NOT NULL"
+        )
+        conn.execute(f"CREATE INDEX keys.{self.KEYS_TABLE}_key_idx ON {self.KEYS_TABLE}(kind, key)")
+        conn.execute(f"CREATE INDEX keys.{self.GROUPS_TABLE}_group_idx ON {self.GROUPS_TABLE}(contact_group_id)")
+
+        float_cols = self._float_cols(conn)
+        conn.execute(f"CREATE TABLE keys.{self.META_TABLE} (version INTEGER, fingerprint TEXT, float_cols TEXT)")
+        conn.execute(
+            f"INSERT INTO keys.{self.META_TABLE} VALUES (?, ?, ?)",
+            (self.KEYS_VERSION, json.dumps(fingerprint), "|".join(float_cols))
+        )
+        conn.commit()
+        conn.execute("DETACH DATABASE keys")
+        return float_cols
+
+    def _float_cols(self, conn):
+        """The enrichment columns pandas reads as float when the whole
+        table is loaded, so records come back with the same types."""
+        # pandas reads a numeric column as float when it has NULLs or REALs
+        value_cols = [c for c in enrich_cols if c != "id"]
+        row_count, *counts = conn.execute("SELECT COUNT(*), " + ", ".join(
+            f"SUM(typeof([{c}]) = 'null'), SUM(typeof([{c}]) = 'real'), SUM(typeof([{c}]) IN ('integer', 'real'))"
+            for c in value_cols
+        ) + " FROM bottoms_up").fetchone()
+        float_cols = []
+        for i, col in enumerate(value_cols):
+            nulls, reals, numbers = (v or 0 for v in counts[3 * i:3 * i + 3])
+            if numbers and nulls + numbers == row_count and (nulls or reals):
+                float_cols.append(col)
+        return float_cols
+
+    def _query_in(self, sql, values, columns):
+        """Run sql once per batch of values, filling its IN ({}) placeholder."""
+        values = list(values)
+        parts = []
+        with closing(self._connect()) as conn:
+            for start in range(0, len(values), self.QUERY_BATCH):
+                batch = values[start:start + self.QUERY_BATCH]
+                query = sql.format(", ".join("?" * len(batch)))
+                parts.append(pd.read_sql_query(query, conn, params=batch))
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(parts, ignore_index=True)
+
+    def match_keys(self, key_col, keys):
+        if key_col == 'BTP SN':
+            if self.keys_path is not None:
+                sql = (f"SELECT k.key, b.id FROM keys.{self.KEYS_TABLE} k JOIN bottoms_up b ON b.rowid = k.row "
+                       "WHERE k.kind = 'serial' AND k.key IN ({})")
+            else:
+                sql = ("SELECT [Serial Number] AS key, id FROM bottoms_up "
+                       "WHERE [Serial Number] IN ({}) AND typeof([Serial Number]) = 'text'")
+            matches = self._query_in(sql, keys, ['key', 'id'])
+            matches['id'] = normalize_ids(matches['id'])
+        elif key_col in ('id', 'phone_number') and self.keys_path is not None:
+            kind = 'id' if key_col == 'id' else 'phone'
+            matches = self._query_in(
+                f"SELECT key, id FROM keys.{self.KEYS_TABLE} WHERE kind = '{kind}' AND key IN ({{}})",
+                keys, ['key', 'id']
+            )
+        elif key_col in ('id', 'phone_number'):
+            if key_col == 'id':
+                keyed = "SELECT normalize_id(id) AS key, id FROM bottoms_up"
+            else:
+                keyed = " UNION ALL ".join(
+                    f"SELECT normalize_phone(CAST([{col}] AS TEXT)) AS key, id FROM bottoms_up" for col in phone_cols
+                )
+            matches = self._query_in(f"SELECT key, id FROM ({keyed}) WHERE key != '' AND key IN ({{}})",
+                                     keys, ['key', 'id'])
+            matches['id'] = normalize_ids(matches['id'])
+        else:
+            raise ValueError(f"Unknown key column: {key_col}")
+        return matches.drop_duplicates()
+
+    def _rows_of_ids(self):
+        """FROM/WHERE clause selecting the bottoms_up rows (b) of the ids
+        in the IN ({}) placeholder, and the expression for their ids."""
+        if self.keys_path is not None:
+            return (f"FROM keys.{self.KEYS_TABLE} k JOIN bottoms_up b ON b.rowid = k.row "
+                    "WHERE k.kind = 'id' AND k.key IN ({})"), "k.key"
+        return "FROM bottoms_up b WHERE normalize_id(b.id) IN ({})", "normalize_id(b.id)"
+
+    def group_pairs(self, ids):
+        id_groups = self.id_group_pairs(ids)
+        members = self.group_member_pairs(id_groups['contact_group_id'].unique())
+        return id_groups.merge(members, on='contact_group_id')[['id', 'member_id']]
+
+    def id_group_pairs(self, ids):
+        # an id belongs to the first non-empty group it appears with
+        rows, id_expr = self._rows_of_ids()
+        return self._query_in(
+            f"SELECT {id_expr} AS id, b.contact_group_id {rows} AND b.contact_group_id IS NOT NULL ORDER BY b.rowid",
+            ids, ['id', 'contact_group_id']
+        ).drop_duplicates('id')
+
+    def group_member_pairs(self, groups):
+        if self.keys_path is not None:
+            sql = (f"SELECT g.contact_group_id, b.id AS member_id FROM keys.{self.GROUPS_TABLE} g "
+                   "JOIN bottoms_up b ON b.rowid = g.row WHERE g.contact_group_id IN ({})")
+        else:
+            sql = "SELECT contact_group_id, id AS member_id FROM bottoms_up WHERE contact_group_id IN ({})"
+        members = self._query_in(sql, groups, ['contact_group_id', 'member_id'])
+        members['member_id'] = normalize_ids(members['member_id'])
+        return members.drop_duplicates()
+
+    def get_records(self, ids):
+        rows, id_expr = self._rows_of_ids()
+        value_cols = ", ".join(f"b.[{c}]" for c in enrich_cols if c != "id")
+        records = self._query_in(
+            f"SELECT {id_expr} AS id, b.rowid AS _pos, {value_cols} {rows} ORDER BY b.rowid",
+            ids, enrich_cols + ['_pos']
+        ).drop_duplicates('id')
+        for col in self.float_cols:
+            records[col] = records[col].astype(float)
+        return records
+
+    def match(self, id=None, phone=None, sn=None):
+        results = set()
+        for key_col, key in (('id', id), ('phone_number', phone), ('BTP SN', sn)):
+            if key:
+                results.update(self.match_keys(key_col, [key.upper().strip()])['id'])
+        return list(results)
+
+# ----------------------- SNAPSHOT -----------------------
+def _save_column(folder, name, values):
+    """Write one column as .npy arrays that SnapshotLookup memory-maps;
+    returns how to read it back.
+
+    Numbers and dates are stored as they are, nullable numbers as values
+    plus mask, categories as codes plus their categories, and text as
+    UTF-8 bytes with row offsets. Object values that are neither str nor
+    None (NaN, or numbers SQLite returned in a text column) are kept
+    exactly in a small pickled side table.
+    """
+    def save(suffix, array):
+        np.save(os.path.join(folder, f"{name}.{suffix}.npy"), array, allow_pickle=False)
+
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        save("codes", values.cat.codes.to_numpy())
+        return {"kind": "category", "ordered": bool(dtype.ordered),
+                "categories": _save_column(folder, f"{name}.categories", pd.Series(dtype.categories))}
+    if isinstance(values.array, pd.core.arrays.masked.BaseMaskedArray):
+        save("values", values.array._data)
+        save("mask", values.array._mask)
+        return {"kind": "masked", "dtype": str(dtype)}
+    if dtype != object and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        save("values", values.to_numpy())
+        return {"kind": "numpy"}
+
+    values = values.to_numpy(dtype=object)
+    kinds = np.zeros(len(values), dtype=np.uint8)
+    encoded = []
+    extras = {}
+    for row, value in enumerate(values):
+        if type(value) is str:
+            kinds[row] = SNAPSHOT_STR
+            encoded.append(value.encode("utf-8", "surrogatepass"))
+            continue
+        encoded.append(b"")
+        if value is not None:
+            kinds[row] = SNAPSHOT_EXTRA
+            extras[row] = value
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    save("kinds", kinds)
+    save("offsets", np.concatenate(([0], np.cumsum(lengths))))
+    save("data", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    with open(os.path.join(folder, f"{name}.extras.pkl"), "wb") as f:
+        pickle.dump(extras, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"kind": "text"}
+
+def _sorted_bytes(keys):
+    """Text keys as a fixed-width bytes array (searchsorted-able) and the
+    order that sorts it."""
+    array = np.array([key.encode("utf-8", "surrogatepass") for key in keys], dtype=bytes)
+    if not len(array):
+        array = np.array([], dtype="S1")
+    return array, np.argsort(array, kind="stable")
+
+def export_snapshot(bottoms_up_index, snapshot_root, fingerprint, logger=print):
+    """Write a BottomsUpIndex as a memory-mappable snapshot under snapshot_root.
+
+    Holds the enrichment columns and every lookup structure the index
+    builds (ids, phone and serial keys, contact-group memberships), all as
+    row positions into those columns. Each database version gets its own
+    directory; the pointer file is switched to it only once it is complete,
+    and older versions are removed unless a process still has them mapped.
+    Returns the new directory.
+    """
+    bottoms_up = bottoms_up_index.bottoms_up
+    name = f"v{SNAPSHOT_VERSION}_{fingerprint['sha256'][:16]}"
+    snapshot_path = os.path.join(snapshot_root, name)
+    shutil.rmtree(snapshot_path, ignore_errors=True)
+    os.makedirs(snapshot_path)
+
+    def save(name, array):
+        np.save(os.path.join(snapshot_path, f"{name}.npy"), array, allow_pickle=False)
+
+    columns = {}
+    for i, col in enumerate(enrich_cols):
+        columns[col] = _save_column(snapshot_path, f"col{i}", bottoms_up[col])
+
+    # ids: sorted, with the position of their first row and their group
+    group_codes = {group: code for code, group in enumerate(bottoms_up_index.group_slices)}
+    ids, order = _sorted_bytes(bottoms_up_index.id_to_row)
+    id_rows = np.fromiter(bottoms_up_index.id_to_row.values(), dtype=np.int64, count=len(order))
+    id_groups = np.array(
+        [group_codes.get(bottoms_up_index.id_to_group.get(id), -1) for id in bottoms_up_index.id_to_row],
+        dtype=np.int64
+    )
+    save("id_keys", ids[order])
+    save("id_rows", id_rows[order])
+    save("id_groups", id_groups[order])
+
+    # group members, laid out group by group as in the index
+    group_bounds = np.zeros(len(group_codes) + 1, dtype=np.int64)
+    member_rows = [np.zeros(0, dtype=np.int64)]
+    for code, (start, stop) in enumerate(bottoms_up_index.group_slices.values()):
+        member_rows.append(bottoms_up_index._member_rows[start:stop])
+        group_bounds[code + 1] = group_bounds[code] + stop - start
+    save("member_rows", np.concatenate(member_rows).astype(np.int64))
+    save("group_bounds", group_bounds)
+    groups = _save_column(snapshot_path, "groups", pd.Series(list(group_codes), dtype=object))
+
+    # key -> first row of the matching id, sorted by key
+    id_to_row = bottoms_up_index.id_to_row
+    phones = bottoms_up_index.key_frames['phone_number']
+    save("phone_keys", phones['key'].to_numpy(dtype=np.int64))
+    save("phone_rows", phones['id'].map(id_to_row).to_numpy(dtype=np.int64))
+    serials = bottoms_up_index.key_frames['BTP SN']
+    serial_keys, order = _sorted_bytes(serials['key'].tolist())
+    save("serial_keys", serial_keys[order])
+    save("serial_rows", serials['id'].map(id_to_row).to_numpy(dtype=np.int64)[order])
+
+    with open(os.path.join(snapshot_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "rows": len(bottoms_up), "columns": columns, "groups": groups}, f,
+                  indent=2)
+    write_snapshot_pointer(snapshot_root, fingerprint, name)
+
+    for old in os.listdir(snapshot_root):
+        if old != name and os.path.isdir(os.path.join(snapshot_root, old)):
+            shutil.rmtree(os.path.join(snapshot_root, old), ignore_errors=True)
+    logger(f"Saved bottoms_up snapshot to {snapshot_path}")
+    return snapshot_path
+
+def write_snapshot_pointer(snapshot_root, fingerprint, name):
+    pointer_path = os.path.join(snapshot_root, SNAPSHOT_POINTER_NAME)
+    with open(pointer_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "fingerprint": fingerprint, "snapshot": name}, f, indent=2)
+    os.replace(pointer_path + ".tmp", pointer_path)
+
+def find_snapshot(snapshot_root, db_path):
+    """Directory of the snapshot of db_path, or None when there is none or it
+    is stale (see fingerprint_matches)."""
+    try:
+        with open(os.path.join(snapshot_root, SNAPSHOT_POINTER_NAME), "r", encoding="utf-8") as f:
+            pointer = json.load(f)
+        if pointer.get("version") != SNAPSHOT_VERSION or not fingerprint_matches(pointer["fingerprint"], db_path):
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    snapshot_path = os.path.join(snapshot_root, pointer["snapshot"])
+    if not os.path.exists(os.path.join(snapshot_path, "meta.json")):
+        return None
+    mtime_ns = os.stat(db_path).st_mtime_ns
+    if pointer["fingerprint"]["mtime_ns"] != mtime_ns:
+        # same content under a new mtime: record it to skip rehashing next time
+        write_snapshot_pointer(snapshot_root, dict(pointer["fingerprint"], mtime_ns=mtime_ns), pointer["snapshot"])
+    return snapshot_path
+
+
+class SnapshotColumn:
+    """One memory-mapped snapshot column; take() decodes the given rows."""
+
+    def __init__(self, folder, name, spec):
+        def load(suffix):
+            return np.load(os.path.join(folder, f"{name}.{suffix}.npy"), mmap_mode="r")
+
+        self.kind = spec["kind"]
+        if self.kind == "category":
+            self.codes = load("codes")
+            self.rows = len(self.codes)
+            categories = SnapshotColumn(folder, f"{name}.categories", spec["categories"])
+            self.dtype = pd.CategoricalDtype(
+                categories.take(np.arange(categories.rows)), ordered=spec["ordered"]
+            )
+        elif self.kind == "masked":
+            self.values, self.mask = load("values"), load("mask")
+            self.rows = len(self.values)
+            self.array_type = pd.api.types.pandas_dtype(spec["dtype"]).construct_array_type()
+        elif self.kind == "numpy":
+            self.values = load("values")
+            self.rows = len(self.values)
+        else:
+            self.kinds, self.offsets, self.data = load("kinds"), load("offsets"), load("data")
+            self.rows = len(self.kinds)
+            with open(os.path.join(folder, f"{name}.extras.pkl"), "rb") as f:
+                self.extras = pickle.load(f)
+
+    def take(self, rows):
+        if self.kind == "category":
+            return pd.Categorical.from_codes(self.codes[rows], dtype=self.dtype)
+        if self.kind == "masked":
+            return self.array_type(np.array(self.values[rows]), np.array(self.mask[rows]))
+        if self.kind == "numpy":
+            return np.array(self.values[rows])
+
+        kinds = self.kinds[rows]
+        out = np.full(len(rows), None, dtype=object)
+        text = np.flatnonzero(kinds == SNAPSHOT_STR)
+        if len(text):
+            starts = self.offsets[rows[text]]
+            lengths = self.offsets[rows[text] + 1] - starts
+            ends = np.cumsum(lengths)
+            # gather the bytes of every value in one read of the data pages
+            buffer = self.data[np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1])].tobytes()
+            bounds = np.concatenate(([0], ends)).tolist()
+            out[text] = [
+                buffer[start:stop].decode("utf-8", "surrogatepass") for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+        for i in np.flatnonzero(kinds == SNAPSHOT_EXTRA).tolist():
+            out[i] = self.extras[int(rows[i])]
+        return out
+
+
+class SnapshotLookup:
+    """Lookup backend over a memory-mapped bottoms_up snapshot.
+
+    Same results as BottomsUpIndex, but nothing is decoded at startup: key
+    lookups are binary searches over the mapped key arrays and only the
+    rows that matched are read and turned into Python values. The pages
+    are shared by every process that maps the same snapshot.
+    """
+
+    def __init__(self, snapshot_path):
+        with open(os.path.join(snapshot_path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.snapshot_path = snapshot_path
+        self.rows = meta["rows"]
+        self.columns = {
+            col: SnapshotColumn(snapshot_path, f"col{i}", meta["columns"][col]) for i, col in enumerate(enrich_cols)
+        }
+
+        def load(name):
+            return np.load(os.path.join(snapshot_path, f"{name}.npy"), mmap_mode="r")
+
+        self.id_keys, self.id_rows, self.id_groups = load("id_keys"), load("id_rows"), load("id_groups")
+        self.member_rows, self.group_bounds = load("member_rows"), load("group_bounds")
+        self.phone_keys, self.phone_rows = load("phone_keys"), load("phone_rows")
+        self.serial_keys, self.serial_rows = load("serial_keys"), load("serial_rows")
+        # contact_group_id of every group code; decoded on first use
+        self.groups = SnapshotColumn(snapshot_path, "groups", meta["groups"])
+        self._group_codes = None
+
+    def __len__(self):
+        return self.rows
+
+    def __reduce__(self):
+        # pickled (e.g. for spawned workers) as its path, and mapped again
+        return (SnapshotLookup, (self.snapshot_path,))
+
+    def _find(self, sorted_keys, keys):
+        """(index into keys, first match, match count) of every key found."""
+        if not len(sorted_keys) or not len(keys):
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        starts = np.searchsorted(sorted_keys, keys, side="left")
+        counts = np.searchsorted(sorted_keys, keys, side="right") - starts
+        found = np.flatnonzero(counts)
+        return found, starts[found], counts[found]
+
+    def _text_keys(self, keys):
+        encoded = [key.encode("utf-8", "surrogatepass") for key in keys]
+        return np.array(encoded, dtype=bytes) if encoded else np.array([], dtype="S1")
+
+    def _ids_at(self, rows):
+        return self.columns['id'].take(rows)
+
+    def id_positions(self, ids):
+        """(index into ids, id_keys position) of every known id."""
+        found, starts, _ = self._find(self.id_keys, self._text_keys(ids))
+        return found, starts
+
+    # Backend interface used by enrich_frame (shared with BottomsUpIndex)
+    def match_keys(self, key_col, keys):
+        """Return (key, id) pairs for the given normalized keys."""
+        keys = np.asarray(keys, dtype=object)
+        if key_col == 'id':
+            found, _ = self.id_positions(keys)
+            return pd.DataFrame({'key': keys[found], 'id': keys[found]})
+        elif key_col == 'phone_number':
+            codes = encode_phones(pd.Series(keys, dtype=object)).to_numpy()
+            keyed = np.flatnonzero((codes != 0) & (codes != -1))
+            found, starts, counts = self._find(self.phone_keys, codes[keyed])
+            found = keyed[found]
+            rows = self.phone_rows[concat_ranges(starts, counts)]
+        elif key_col == 'BTP SN':
+            found, starts, counts = self._find(self.serial_keys, self._text_keys(keys))
+            rows = self.serial_rows[concat_ranges(starts, counts)]
+        else:
+            raise ValueError(f"Unknown key column: {key_col}")
+        return pd.DataFrame({'key': np.repeat(keys[found], counts), 'id': self._ids_at(rows)})
+
+    def group_pairs(self, ids):
+        """Return (id, member_id) pairs linking ids to every member of their contact group."""
+        ids = np.asarray(ids, dtype=object)
+        found, positions = self.id_positions(ids)
+        groups = self.id_groups[positions]
+        grouped = groups >= 0
+        found, groups = found[grouped], groups[grouped]
+        starts = self.group_bounds[groups]
+        counts = self.group_bounds[groups + 1] - starts
+        member_rows = self.member_rows[concat_ranges(starts, counts)]
+        return pd.DataFrame({'id': np.repeat(ids[found], counts), 'member_id': self._ids_at(member_rows)})
+
+    def id_group_pairs(self, ids):
+        """Return (id, contact_group_id) for the ids that belong to a contact group."""
+        ids = np.asarray(ids, dtype=object)
+        found, positions = self.id_positions(ids)
+        groups = np.asarray(self.id_groups[positions])
+        grouped = groups >= 0
+        return pd.DataFrame({'id': ids[found[grouped]], 'contact_group_id': self.groups.take(groups[grouped])})
+
+    def group_member_pairs(self, groups):
+        """Return (contact_group_id, member_id) for every member of the given groups."""
+        if self._group_codes is None:
+            names = self.groups.take(np.arange(self.groups.rows))
+            self._group_codes = {group: code for code, group in enumerate(names)}
+        groups = np.asarray(groups, dtype=object)
+        codes = np.fromiter((self._group_codes.get(group, -1) for group in groups), dtype=np.int64, count=len(groups))
+        known = np.flatnonzero(codes >= 0)
+        starts = self.group_bounds[codes[known]]
+        counts = self.group_bounds[codes[known] + 1] - starts
+        member_rows = self.member_rows[concat_ranges(starts, counts)]
+        return pd.DataFrame({
+            'contact_group_id': np.repeat(groups[known], counts), 'member_id': self._ids_at(member_rows)
+        })
+
+    def get_records(self, ids):
+        """Return the enrichment columns and bottoms_up position of each known id."""
+        _, positions = self.id_positions(list(ids))
+        rows = np.asarray(self.id_rows[positions], dtype=np.int64)
+        records = pd.DataFrame({col: column.take(rows) for col, column in self.columns.items()})
+        records['_pos'] = rows
+        return records
+
+    def match(self, id=None, phone=None, sn=None):
+        results = set()
+        for key_col, key in (('id', id), ('phone_number', phone), ('BTP SN', sn)):
+            if key:
+                results.update(self.match_keys(key_col, [key.upper().strip()])['id'])
+        return list(results)
+
+def load_snapshot_lookup(BOTTOMS_UP_FOLDER, logger=print, use_cache=True, report=None, db_path=None):
+    """Return a SnapshotLookup for the database in BOTTOMS_UP_FOLDER (or for
+    the shard db_path), exporting the snapshot first when it is missing or
+    stale."""
+    snapshot_root = db_sidecar_path(BOTTOMS_UP_FOLDER, SNAPSHOT_DIR_NAME, db_path)
+    shard_path = db_path
+    db_path = db_path or find_bottoms_up_db(BOTTOMS_UP_FOLDER, logger=logger)
+    snapshot_path = find_snapshot(snapshot_root, db_path)
+    if snapshot_path is None:
+        fingerprint = file_fingerprint(db_path)
+        bottoms_up_index = load_bottoms_up_index(BOTTOMS_UP_FOLDER, logger=logger, use_cache=use_cache, report=report,
+                                                 db_path=shard_path)
+        snapshot_path = export_snapshot(bottoms_up_index, snapshot_root, fingerprint, logger=logger)
+    else:
+        logger("Mapped bottoms_up snapshot.")
+    return SnapshotLookup(snapshot_path)
+
+# ----------------------- SHARDS -----------------------
+class ShardedLookup:
+    """Lookup backend over several bottoms_up databases with the same schema
+    (e.g. one per state or quarter), each opened with one of the other
+    backends and queried in parallel on a thread pool.
+
+    Results are those of a single database holding the shards' rows one
+    after another in file name order: a key matches in every shard, an id's
+    contact group is the first one it has in any shard and takes in that
+    group's members from all shards, and an id's record comes from the
+    first shard that has it. Records carry SHARD_COL naming that shard.
+    """
+
+    def __init__(self, names, lookups, threads=SHARD_THREADS):
+        self.names = names
+        self.lookups = lookups
+        self.threads = threads
+
+    def _each(self, method, *args):
+        """method(*args) on every shard, in shard order."""
+        def call(lookup):
+            return getattr(lookup, method)(*args)
+
+        # a pool per call: threads don't survive the fork into pool workers
+        with ThreadPoolExecutor(min(self.threads, len(self.lookups))) as executor:
+            return list(executor.map(call, self.lookups))
+
+    def match_keys(self, key_col, keys):
+        """Return (key, id) pairs for the given normalized keys."""
+        return pd.concat(self._each('match_keys', key_col, keys), ignore_index=True).drop_duplicates()
+
+    def id_group_pairs(self, ids):
+        """Return (id, contact_group_id) for the ids that belong to a contact group."""
+        pairs = pd.concat(self._each('id_group_pairs', ids), ignore_index=True)
+        pairs['contact_group_id'] = pairs['contact_group_id'].astype(object)
+        return pairs.drop_duplicates('id')
+
+    def group_member_pairs(self, groups):
+        """Return (contact_group_id, member_id) for every member of the given groups."""
+        pairs = pd.concat(self._each('group_member_pairs', groups), ignore_index=True)
+        pairs['contact_group_id'] = pairs['contact_group_id'].astype(object)
+        return pairs.drop_duplicates()
+
+    def group_pairs(self, ids):
+        """Return (id, member_id) pairs linking ids to every member of their contact group."""
+        id_groups = self.id_group_pairs(ids)
+        members = self.group_member_pairs(id_groups['contact_group_id'].unique())
+        return id_groups.merge(members, on='contact_group_id')[['id', 'member_id']]
+
+    def get_records(self, ids):
+        """Return the enrichment columns, position and shard of each known id."""
+        parts = self._each('get_records', ids)
+        for shard, records in enumerate(parts):
+            records['_pos'] = records['_pos'].astype(np.int64) + shard * SHARD_POS_STRIDE
+            records[SHARD_COL] = self.names[shard]
+        return pd.concat(parts, ignore_index=True).drop_duplicates('id')
+
+    def match(self, id=None, phone=None, sn=None):
+        return list(dict.fromkeys(chain.from_iterable(self._each('match', id, phone, sn))))
+
+def open_sharded_lookup(BOTTOMS_UP_FOLDER, db_paths, backend="memory", logger=print, use_cache=True, report=None):
+    """Open every shard in db_paths with the given backend, in parallel, and
+    combine them in a ShardedLookup. Each shard keeps its own index cache
+    or snapshot next to it."""
+    names = [os.path.basename(db_path) for db_path in db_paths]
+    shard_reports = [RunReport() for _ in db_paths]
+
+    def open_shard(shard):
+        return open_db_lookup(BOTTOMS_UP_FOLDER, backend, lambda message: logger(f"{names[shard]}: {message}"),
+                              use_cache, shard_reports[shard], db_paths[shard])
+
+    with ThreadPoolExecutor(min(SHARD_THREADS, len(db_paths))) as executor:
+        lookups = list(executor.map(open_shard, range(len(db_paths))))
+    if report is not None:
+        for shard_report in shard_reports:
+            report.merge(shard_report)
+    logger(f"Opened {len(db_paths)} bottoms_up shards: {', '.join(names)}")
+    return ShardedLookup(names, lookups)
+
+# ----------------------- PARALLEL -----------------------
+# lookup used by pool workers: inherited from the parent on fork, or loaded
+# once per worker (from the index cache) on platforms that spawn
+_worker_lookup = None
+# per-worker MatchMemo, created on the first task that asks for one
+_worker_memo = None
+
+def open_lookup(BOTTOMS_UP_FOLDER, backend="memory", logger=print, use_cache=True, report=None):
+    """Open the lookup backend: "memory" loads and indexes the whole table,
+    "sqlite" queries it per batch of keys, "snapshot" maps the table and
+    its indexes from disk. Several .db files are opened as shards of one
+    ShardedLookup."""
+    db_paths = find_bottoms_up_dbs(BOTTOMS_UP_FOLDER, logger=logger)
+    if len(db_paths) > 1:
+        return open_sharded_lookup(BOTTOMS_UP_FOLDER, db_paths, backend, logger=logger, use_cache=use_cache,
+                                   report=report)
+    return open_db_lookup(BOTTOMS_UP_FOLDER, backend, logger=logger, use_cache=use_cache, report=report)
+
+def open_db_lookup(BOTTOMS_UP_FOLDER, backend="memory", logger=print, use_cache=True, report=None, db_path=None):
+    """open_lookup for the folder's only .db file, or for the shard db_path."""
+    if backend == "snapshot":
+        return load_snapshot_lookup(BOTTOMS_UP_FOLDER, logger=logger, use_cache=use_cache, report=report,
+                                    db_path=db_path)
+    if backend == "sqlite":
+        return SqliteLookup(db_path or find_bottoms_up_db(BOTTOMS_UP_FOLDER, logger=logger),
+                            db_sidecar_path(BOTTOMS_UP_FOLDER, SQLITE_KEYS_NAME, db_path), logger=logger)
+    return load_bottoms_up_index(BOTTOMS_UP_FOLDER, logger=logger, use_cache=use_cache, report=report, db_path=db_path)
+
+def _init_worker(BOTTOMS_UP_FOLDER, backend, use_cache):
+    global _worker_lookup
+    _worker_lookup = open_lookup(BOTTOMS_UP_FOLDER, backend, logger=lambda message: None, use_cache=use_cache)
+
+def _load_input_task(file_path, multi_key=False):
+    report = RunReport()
+    with report.phase("parse"):
+        df = load_input_file(file_path, multi_key)
+    return df, report
+
+def _enrich_task(task):
+    global _worker_memo
+    job_index, start, df, key_col, memoize, max_row_fanout = task
+    if memoize and _worker_memo is None:
+        _worker_memo = MatchMemo(_worker_lookup)
+    report = RunReport()
+    output_df = enrich_batch(df, _worker_lookup, key_col, report=report, memo=_worker_memo if memoize else None,
+                             max_row_fanout=max_row_fanout)
+    return job_index, start, len(df), output_df, report
+
+def start_worker_pool(workers, lookup, BOTTOMS_UP_FOLDER, backend="memory", use_cache=True, logger=print):
+    """Start a process pool whose workers all see the parent's lookup.
+
+    Where fork is safe the workers inherit the already-built lookup
+    (copy-on-write, nothing is pickled); elsewhere (spawn, as on Windows)
+    each worker opens the database once at startup. A memory index would
+    then be loaded into every worker, so spawned workers map the shared
+    bottoms_up snapshot instead (exported here first if missing), which
+    gives the same results.
+    """
+    global _worker_lookup, _worker_memo
+    _worker_memo = None
+    if "fork" in multiprocessing.get_all_start_methods() and sys.platform != "darwin":
+        _worker_lookup = lookup
+        return multiprocessing.get_context("fork").Pool(workers)
+    if backend == "memory":
+        logger(f"Sharing the bottoms_up snapshot with {workers} worker processes.")
+        open_lookup(BOTTOMS_UP_FOLDER, "snapshot", logger=logger, use_cache=use_cache)
+        backend = "snapshot"
+    return multiprocessing.get_context("spawn").Pool(
+        workers, initializer=_init_worker, initargs=(BOTTOMS_UP_FOLDER, backend, use_cache)
+    )
+
+def stop_worker_pool(pool):
+    global _worker_lookup
+    pool.terminate()
+    pool.join()
+    _worker_lookup = None
+
+def enrich_files_parallel(pool, jobs, report_progress, report=None, memoize=False, max_row_fanout=None):
+    """Enrich prepared files on the pool in ENRICH_BATCH_ROWS row ranges.
+
+    jobs is a list of (filename, df, key_col) tuples. Yields
+    (job index, enriched frame) as each file completes, with its rows in
+    the same order the serial path produces. Worker statistics are merged
+    into report. With memoize each worker keeps its own MatchMemo.
+    """
+    tasks = []
+    remaining = {}
+    for job_index, (filename, df, key_col) in enumerate(jobs):
+        starts = range(0, len(df), ENRICH_BATCH_ROWS)
+        remaining[job_index] = len(starts)
+        for start in starts:
+            tasks.append((job_index, start, df.iloc[start:start + ENRICH_BATCH_ROWS], key_col, memoize, max_row_fanout))
+
+    parts = {job_index: {} for job_index in remaining}
+    for job_index, start, rows, output_df, task_report in pool.imap_unordered(_enrich_task, tasks):
+        if report is not None:
+            report.merge(task_report)
+        parts[job_index][start] = output_df
+        report_progress(rows, jobs[job_index][0])
+        remaining[job_index] -= 1
+        if remaining[job_index] == 0:
+            file_parts = parts.pop(job_index)
+            yield job_index, pd.concat([file_parts[start] for start in sorted(file_parts)])
+
+# ----------------------- PREFLIGHT -----------------------
+class FanoutEstimate:
+    """Preflight statistics of one input file, added up frame by frame.
+
+    add() takes prepared frames (the whole file, or streamed chunks) and
+    counts how many output rows enrich_batch would give each row without
+    building them: the ids each key resolves to come from a MatchMemo,
+    which the run then reuses, and the contact groups hit from the keys'
+    direct matches. Without a memo (streamed files) each frame gets a
+    memo of its own, so memory stays bounded by the chunk.
+    """
+
+    def __init__(self, lookup, key_col, memo=None, max_row_fanout=None):
+        self.lookup = lookup
+        self.key_col = key_col
+        self.memo = memo
+        self.max_row_fanout = max_row_fanout
+        self.rows_in = 0
+        self.matched_rows = 0
+        self.rows_out = 0
+        self.capped_rows = 0
+        self.max_fanout = 0
+        self.group_rows = Counter()
+
+    def _keyed_rows(self, df):
+        """(_row, key, key_col) of every non-blank key of df, by _row."""
+        if isinstance(self.key_col, list):
+            return multi_key_rows(df, self.key_col).sort_values('_row', kind='stable')
+        keys = normalize_ids(df[self.key_col].fillna(''))
+        rows = pd.DataFrame({'_row': np.arange(len(df)), 'key': keys.to_numpy(), 'key_col': self.key_col})
+        return rows[rows['key'] != '']
+
+    def _ids_per_row(self, rows, row_count, memo):
+        # the memo's statistics belong to the run, not to the preflight
+        scratch = RunReport()
+        if not isinstance(self.key_col, list):
+            keys = rows['key'].unique()
+            memo.plan(self.key_col, keys.tolist(), scratch)
+            known = memo.key_ids[self.key_col]
+            counts = np.fromiter((len(known[key]) for key in keys), dtype=np.int64, count=len(keys))
+            key_counts = counts[pd.Index(keys).get_indexer(rows['key'])]
+            return np.bincount(rows['_row'].to_numpy(dtype=np.int64), weights=key_counts,
+                               minlength=row_count).astype(np.int64)
+
+        # multi-key: a row's keys can share ids, so union them per row,
+        # ENRICH_BATCH_ROWS rows at a time
+        ids_per_row = np.zeros(row_count, dtype=np.int64)
+        row_numbers = rows['_row'].to_numpy()
+        for start in range(0, row_count, ENRICH_BATCH_ROWS):
+            lo, hi = np.searchsorted(row_numbers, [start, start + ENRICH_BATCH_ROWS])
+            parts = [
+                col_rows[['_row', 'key']].merge(
+                    memo.resolve(col, col_rows['key'].unique().tolist(), scratch), on='key'
+                )
+                for col, col_rows in rows.iloc[lo:hi].groupby('key_col', sort=False)
+            ]
+            if parts:
+                matched = pd.concat(parts)[['_row', 'id']].drop_duplicates()
+                ids_per_row[start:start + ENRICH_BATCH_ROWS] += np.bincount(
+                    matched['_row'].to_numpy(dtype=np.int64) - start,
+                    minlength=min(ENRICH_BATCH_ROWS, row_count - start),
+                )
+        return ids_per_row
+
+    def _count_groups(self, rows):
+        """Add the rows that hit each contact group through a direct match."""
+        parts = [
+            col_rows[['_row', 'key']].merge(self.lookup.match_keys(col, col_rows['key'].unique()), on='key')
+            for col, col_rows in rows.groupby('key_col', sort=False)
+        ]
+        matched = pd.concat(parts)[['_row', 'id']] if parts else None
+        if matched is None or not len(matched):
+            return
+        groups = self.lookup.id_group_pairs(matched['id'].unique())
+        hits = matched.merge(groups, on='id')[['_row', 'contact_group_id']].drop_duplicates()
+        self.group_rows.update(hits['contact_group_id'].value_counts().to_dict())
+
+    def add(self, df):
+        """Count one prepared frame of the file."""
+        rows = self._keyed_rows(df)
+        ids_per_row = self._ids_per_row(rows, len(df), self.memo or MatchMemo(self.lookup))
+        self._count_groups(rows)
+
+        # unmatched rows are written once, blank
+        rows_out = np.maximum(ids_per_row, 1)
+        if self.max_row_fanout is not None:
+            self.capped_rows += int(np.count_nonzero(rows_out > self.max_row_fanout))
+            rows_out = np.minimum(rows_out, self.max_row_fanout)
+        self.rows_in += len(df)
+        self.matched_rows += int(np.count_nonzero(ids_per_row))
+        self.rows_out += int(rows_out.sum())
+        self.max_fanout = max(self.max_fanout, int(ids_per_row.max(initial=0)))
+
+    def finish(self, top_groups=PREFLIGHT_TOP_GROUPS):
+        """The file's statistics, as stored in the run report."""
+        sizes = {}
+        if self.group_rows:
+            members = self.lookup.group_member_pairs(list(self.group_rows))
+            sizes = members.groupby('contact_group_id')['member_id'].nunique().to_dict()
+        largest = sorted(self.group_rows, key=lambda group: (-sizes.get(group, 0), -self.group_rows[group], str(group)))
+        return {
+            "key_col": self.key_col,
+            "rows_in": self.rows_in,
+            "matched_rows": self.matched_rows,
+            "match_rate": round(self.matched_rows / self.rows_in, 4) if self.rows_in else 0.0,
+            "expected_rows_out": self.rows_out,
+            "max_row_fanout": self.max_fanout,
+            "capped_rows": self.capped_rows,
+            "largest_groups": [
+                {"contact_group_id": str(group), "members": int(sizes.get(group, 0)), "rows": self.group_rows[group]}
+                for group in largest[:top_groups]
+            ],
+        }
+
+def preflight_files(files, lookup, INPUT_FOLDER, memo=None, multi_key=False, max_row_fanout=None,
+                    is_streamed=lambda filename: False, stream_chunk_rows=STREAM_CHUNK_ROWS, report=None):
+    """Estimate each file's enrichment without writing any output.
+
+    Files are read the way the run reads them (streamed ones chunk by
+    chunk, and like the run without filling memo). Returns ({filename: FanoutEstimate.finish()}, {filename: error})
+    for the files with a key column and those that could not be read.
+    """
+    if memo is None:
+        memo = MatchMemo(lookup)
+    if report is None:
+        report = RunReport()
+    estimates, errors = {}, {}
+    for filename in files:
+        file_path = os.path.join(INPUT_FOLDER, filename)
+        try:
+            with report.phase("preflight"):
+                file_memo = memo
+                if is_streamed(filename):
+                    file_memo = None
+                    key_col = file_key_cols(read_input_columns(file_path), multi_key)
+                    frames = iter_input_chunks(file_path, stream_chunk_rows)
+                    if not multi_key:
+                        frames = map(prepare_input, frames)
+                else:
+                    df = load_input_file(file_path, multi_key)
+                    key_col = None if df is None else file_key_cols(df.columns, multi_key)
+                    frames = [df]
+                if key_col is None:
+                    continue
+                estimate = FanoutEstimate(lookup, key_col, file_memo, max_row_fanout)
+                for frame in frames:
+                    estimate.add(frame)
+            estimates[filename] = estimate.finish()
+        except Exception as e:
+            errors[filename] = e
+    return estimates, errors
+
+def preflight_summary(filename, estimate, output_path):
+    """One log line per file for a preflight estimate."""
+    line = (
+        f"{filename}: {estimate['rows_in']:,} rows, {estimate['match_rate']:.1%} matched, "
+        f"about {estimate['expected_rows_out']:,} output rows (up to {estimate['max_row_fanout']:,} per row)"
+    )
+    if estimate["capped_rows"]:
+        line += f"; {estimate['capped_rows']:,} rows over max_row_fanout"
+    if estimate["largest_groups"]:
+        line += "; largest groups: " + ", ".join(
+            f"{group['contact_group_id']} ({group['members']:,} members, {group['rows']:,} rows)"
+            for group in estimate["largest_groups"]
+        )
+    if output_path.endswith(".xlsx") and estimate["expected_rows_out"] >= EXCEL_MAX_ROWS:
+        sheets = -(-estimate["expected_rows_out"] // (EXCEL_MAX_ROWS - 1))
+        line += f"; needs {sheets} Excel sheets"
+    return line
+
 # ------------------ MAIN SCRIPT ------------------
-def main(INPUT_FOLDER=INPUT_FOLDER, OUTPUT_FOLDER=OUTPUT_FOLDER, BOTTOMS_UP_FOLDER=BOTTOMS_UP_FOLDER, logger=print, progress_callback=None):
+def main(INPUT_FOLDER=INPUT_FOLDER, OUTPUT_FOLDER=OUTPUT_FOLDER, BOTTOMS_UP_FOLDER=BOTTOMS_UP_FOLDER, logger=print, progress_callback=None,
+         use_cache=True, backend="memory", stream_csv=False, stream_excel=False, stream_chunk_rows=STREAM_CHUNK_ROWS,
+         workers=1, telemetry=None, report=True, profile=False, incremental=True, memoize=True, multi_key=False,
+         output_format=None, lookup=None, preflight=False, max_row_fanout=None, max_file_rows=None,
+         oversize_action="skip"):
     for folder in [INPUT_FOLDER, OUTPUT_FOLDER, BOTTOMS_UP_FOLDER]:
         os.makedirs(folder, exist_ok=True)
 
-    bottoms_up = load_bottoms_up_db(BOTTOMS_UP_FOLDER, logger=logger)
-    if bottoms_up is None: 
+    # report: write a run_report_<time>.json to OUTPUT_FOLDER;
+    # profile: also run under cProfile and dump run_profile_<time>.prof;
+    # incremental: skip files finished by an earlier run (see RunManifest);
+    # memoize: resolve each distinct key once across all files (see MatchMemo);
+    # multi_key: match on every key column a file has (see enrich_frame_multi);
+    # output_format: write every output as one of OUTPUT_FORMATS instead of
+    # the input's format;
+    # lookup: an already opened backend for BOTTOMS_UP_FOLDER's database
+    # (the GUI's prewarmed index), used instead of loading it again;
+    # preflight: only estimate each file's match rate, output rows and
+    # largest contact groups (see FanoutEstimate), writing no outputs;
+    # max_row_fanout: keep at most this many matches of any input row;
+    # max_file_rows: preflight first, then skip (oversize_action="skip") or
+    # stream as CSV ("stream") every file expected to give more output rows
+    if output_format is not None and output_format not in OUTPUT_FORMATS:
+        raise RuntimeError(f"Unknown output format {output_format!r}, expected one of {OUTPUT_FORMATS}")
+    if max_row_fanout is not None and max_row_fanout < 1:
+        raise RuntimeError(f"max_row_fanout must be at least 1, not {max_row_fanout}")
+    if oversize_action not in GUARD_ACTIONS:
+        raise RuntimeError(f"Unknown oversize action {oversize_action!r}, expected one of {GUARD_ACTIONS}")
+    run_report = RunReport(backend=backend, workers=workers, use_cache=use_cache,
+                           stream_csv=stream_csv, stream_excel=stream_excel, incremental=incremental,
+                           memoize=memoize, multi_key=multi_key, output_format=output_format,
+                           preflight=preflight, max_row_fanout=max_row_fanout, max_file_rows=max_file_rows,
+                           oversize_action=oversize_action)
+    profiler = cProfile.Profile() if profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        run_main(INPUT_FOLDER, OUTPUT_FOLDER, BOTTOMS_UP_FOLDER, logger, progress_callback, use_cache, backend,
+                 stream_csv, stream_excel, stream_chunk_rows, workers, telemetry, run_report, incremental, memoize,
+                 multi_key, output_format, lookup, preflight, max_row_fanout, max_file_rows, oversize_action)
+    except Exception as e:
+        run_report.status = f"failed: {e}"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            run_report.add_profile(profiler, OUTPUT_FOLDER)
+        if report and run_report.files:
+            try:
+                logger(f"Run report saved to {run_report.write(OUTPUT_FOLDER)}")
+            except OSError as e:
+                logger(f"Could not write run report: {e}")
+
+def run_main(INPUT_FOLDER, OUTPUT_FOLDER, BOTTOMS_UP_FOLDER, logger, progress_callback, use_cache, backend,
+             stream_csv, stream_excel, stream_chunk_rows, workers, telemetry, run_report, incremental=True,
+             memoize=True, multi_key=False, output_format=None, lookup=None, preflight=False, max_row_fanout=None,
+             max_file_rows=None, oversize_action="skip"):
+    # progress_callback(fraction, filename) and telemetry(ProgressEvent) are
+    # both fed by one throttled tracker
+    progress = ProgressTracker([
+        (lambda event: progress_callback(event.fraction, event.filename)) if progress_callback else None,
+        telemetry,
+    ])
+    files = [f for f in os.listdir(INPUT_FOLDER) if f.endswith(INPUT_EXTENSIONS)]
+
+    # With nothing changed since the last run, don't even load the database
+    # (a preflight looks at every file)
+    manifest = None
+    if incremental and files and not preflight:
+        db_paths = find_bottoms_up_dbs(BOTTOMS_UP_FOLDER, logger=logger)
+        manifest = RunManifest(OUTPUT_FOLDER, db_paths,
+                               output_settings(multi_key, output_format, max_row_fanout, backend, db_paths), logger=logger)
+        manifest.prune(files)
+        if not manifest.pending(files, INPUT_FOLDER):
+            for filename in files:
+                run_report.file(filename)["status"] = "unchanged: kept existing output"
+            logger("All files are up to date; nothing to process.")
+            return
+
+    progress.set_phase(PHASE_LOAD_DB)
+    if lookup is not None:
+        run_report.settings["preloaded_index"] = True
+        logger("Using the preloaded bottoms_up index.")
+    else:
+        with run_report.phase("DB load"):
+            lookup = open_lookup(BOTTOMS_UP_FOLDER, backend, logger=logger, use_cache=use_cache, report=run_report)
+    if lookup is None: 
         return
 
     # Process input files if any
-    files = [f for f in os.listdir(INPUT_FOLDER) if f.endswith((".xlsx", ".csv"))]
     if not files:
         logger(f"No input files found in '{INPUT_FOLDER}'. Please add files to process.")
         return
-    
-    total_rows = 0
-    file_row_counts = {}
-    skipped_files = []
 
-    for filename in files:
-        file_path = os.path.join(INPUT_FOLDER, filename)
-        if filename.endswith(".xlsx"):
-            df = pd.read_excel(file_path, dtype=str)
-        elif filename.endswith(".csv"):
-            df = pd.read_csv(file_path, dtype=str)
+    # workers > 1 spreads parsing and row ranges of every file over a process pool
+    pool = None
+    if workers > 1 and not preflight:
+        pool = start_worker_pool(workers, lookup, BOTTOMS_UP_FOLDER, backend, use_cache, logger)
+    try:
+        run_files(files, lookup, INPUT_FOLDER, OUTPUT_FOLDER, logger, progress,
+                  stream_csv, stream_excel, stream_chunk_rows, pool, run_report, manifest,
+                  MatchMemo(lookup) if memoize else None, multi_key, output_format, preflight=preflight,
+                  max_row_fanout=max_row_fanout, max_file_rows=max_file_rows, oversize_action=oversize_action)
+    finally:
+        if pool is not None:
+            stop_worker_pool(pool)
+
+def scaled_progress(report_progress, input_rows, prepared_rows):
+    """report_progress for a file's prepared (exploded) rows that reports
+    the same share of its input rows, so progress stays in input rows.
+    Advancing past prepared_rows reports whatever is left."""
+    done = {"prepared": 0, "reported": 0}
+
+    def advance(rows, filename=None):
+        done["prepared"] += rows
+        if done["prepared"] >= prepared_rows:
+            reported = input_rows
         else:
-            continue
+            reported = done["prepared"] * input_rows // prepared_rows
+        report_progress(reported - done["reported"], filename)
+        done["reported"] = reported
+    return advance
+
+def run_files(files, lookup, INPUT_FOLDER, OUTPUT_FOLDER, logger=print, progress=None,
+              stream_csv=False, stream_excel=False, stream_chunk_rows=STREAM_CHUNK_ROWS, pool=None, report=None,
+              manifest=None, memo=None, multi_key=False, output_format=None, popups=True, preflight=False,
+              max_row_fanout=None, max_file_rows=None, oversize_action="skip"):
+    # popups=False keeps headless callers (watch.py) from opening message boxes
+    if progress is None:
+        progress = ProgressTracker()
+    if report is None:
+        report = RunReport()
+
+    # files the output-size guard streams, and their output formats
+    guard_streamed = set()
+    file_formats = {}
+
+    def output_path_for(filename):
+        return output_file_path(OUTPUT_FOLDER, filename, file_formats.get(filename, output_format))
 
-        df = separate_by_rows(df)
+    def is_streamed(filename):
+        return (filename in guard_streamed or (stream_csv and filename.endswith(".csv"))
+                or (stream_excel and filename.endswith(".xlsx")))
 
-        if 'phone_number' in df.columns:
-            df['phone_number'] = df['phone_number'].fillna('').apply(normalize_phone)
-        elif 'id' in df.columns:
-            df = df[df['id'].notna() & (df['id'].str.strip().str.lower() != 'nan') & (df['id'].str.strip() != '')]
-        elif 'BTP SN' in df.columns:
-            df = df[df['BTP SN'].notna() & (df['BTP SN'].str.strip().str.lower() != 'nan') & (df['BTP SN'].str.strip() != '')]
-            df['BTP SN'] = df['BTP SN'].str.replace(r'(?i)^TX-?', '', regex=True).str.strip()
+    def finished(filename):
+        if manifest is not None:
+            manifest.record(filename, os.path.join(INPUT_FOLDER, filename), output_path_for(filename))
+
+    # Files an earlier run already finished against the same database keep
+    # their outputs
+    pending_files = files
+    if manifest is not None:
+        pending_files = manifest.pending(files, INPUT_FOLDER)
+        unchanged = [f for f in files if f not in pending_files]
+        for filename in unchanged:
+            report.file(filename)["status"] = "unchanged: kept existing output"
+        if unchanged:
+            logger(f"Skipping {len(unchanged)} unchanged file(s): {', '.join(unchanged)}")
+        if not pending_files:
+            logger("All files are up to date; nothing to process.")
+            return
+
+    # Preflight: estimate every file's output before the expensive run, and
+    # keep files over max_file_rows from being enriched in memory
+    oversized_files = []
+    if preflight or max_file_rows is not None:
+        progress.set_phase(PHASE_PREFLIGHT)
+        estimates, errors = preflight_files(pending_files, lookup, INPUT_FOLDER, memo, multi_key, max_row_fanout,
+                                            is_streamed, stream_chunk_rows, report)
+        for filename in pending_files:
+            if filename in estimates:
+                report.file(filename)["preflight"] = estimates[filename]
+                logger(preflight_summary(filename, estimates[filename], output_path_for(filename)))
+        if preflight:
+            for filename in pending_files:
+                if filename in errors:
+                    report.file(filename)["status"] = f"failed: {errors[filename]}"
+                    logger(f"{filename}: could not be read: {errors[filename]}")
+                elif filename not in estimates:
+                    report.file(filename)["status"] = "skipped: missing required columns"
+                    logger(f"{filename}: missing required columns {key_cols}")
+                else:
+                    report.file(filename)["status"] = "preflight: no output written"
+            logger("Preflight finished; no output files were written.")
+            return
+
+        for filename, estimate in estimates.items():
+            if estimate["expected_rows_out"] <= max_file_rows:
+                continue
+            msg = f"{filename}: about {estimate['expected_rows_out']:,} output rows, over max_file_rows={max_file_rows:,}"
+            if oversize_action == "stream":
+                guard_streamed.add(filename)
+                if output_path_for(filename).endswith(".xlsx"):
+                    file_formats[filename] = GUARD_STREAM_FORMAT
+                logger(f"{msg}; streaming it to {os.path.basename(output_path_for(filename))}")
+                continue
+            if len(files) == 1:
+                # Only one file to process → fatal
+                logger(f"\nError: {msg}")
+                raise RuntimeError(msg)
+            oversized_files.append(filename)
+            report.file(filename)["status"] = "skipped: output over max_file_rows"
+            logger(f"\nSkipping {msg}")
+        pending_files = [f for f in pending_files if f not in oversized_files]
 
+    def warn_oversized():
+        if not oversized_files:
+            return
+        summary_msg = (
+            f"The following files were skipped because their output would exceed {max_file_rows:,} rows "
+            "(max_file_rows):\n" + "\n".join(oversized_files)
+        )
+        logger("\n" + summary_msg)
 
-        file_row_counts[filename] = len(df)
-        total_rows += len(df)
+        if len(files) > 1 and popups:
+            try:
+                from tkinter import messagebox
+                messagebox.showwarning("Oversized Files", summary_msg)
+            except:
+                pass
 
-    if total_rows == 0:
-        logger("No rows to process.")
+    file_row_counts = {}
+    skipped_files = []
+    failed_files = []
+    # files that failed in any stage; later stages drop the rest of their items
+    failed = set()
+    # the read and match stages run on their own threads and keep their own
+    # statistics, merged into report at the end
+    read_report, match_report = RunReport(), RunReport()
+
+    # Input rows of every file up front, so progress spans the whole run
+    # while later files are still being parsed
+    for filename in pending_files:
+        try:
+            file_row_counts[filename] = count_input_rows(os.path.join(INPUT_FOLDER, filename))
+        except Exception:
+            file_row_counts[filename] = None  # unreadable: the read stage reports it
+    total_rows = sum(row_count or 0 for row_count in file_row_counts.values())
+
+    if total_rows == 0 and None not in file_row_counts.values():
+        if pending_files:
+            logger("No rows to process.")
+        # files skipped for their size are still reported
+        warn_oversized()
         return
-    
-    processed_rows = 0
-    for filename in files:
-        file_path = os.path.join(INPUT_FOLDER, filename)
 
-        # Detect file type
-        if filename.endswith(".xlsx"):
-            df = pd.read_excel(file_path, dtype=str)
-            output_ext = ".xlsx"
-        elif filename.endswith(".csv"):
-            df = pd.read_csv(file_path, dtype=str)
-            output_ext = ".csv"
+    progress.start(total_rows)
+    progress.set_phase(PHASE_PARSE)
+    rows_reported = Counter()
+
+    def report_progress(rows, filename=None):
+        rows_reported[filename] += rows
+        progress.advance(rows, filename)
+
+    def skip_progress(filename):
+        # count the rows of a skipped or failed file as done
+        remaining = (file_row_counts[filename] or 0) - rows_reported[filename]
+        if remaining > 0:
+            report_progress(remaining, filename)
+
+    # Read stage: whole files are parsed (by pool workers, a few files
+    # ahead, when there is a pool) and handed on as prepared frames;
+    # streamed files are handed on chunk by chunk
+    load_task = partial(_load_input_task, multi_key=multi_key)
+
+    def parse_results(filenames):
+        in_flight = deque()
+        for filename in filenames:
+            path = os.path.join(INPUT_FOLDER, filename)
+            in_flight.append((filename, path, pool.apply_async(load_task, (path,)) if pool is not None else None))
+            if len(in_flight) >= PIPELINE_READ_AHEAD or pool is None:
+                yield parse_result(*in_flight.popleft())
+        while in_flight:
+            yield parse_result(*in_flight.popleft())
+
+    def parse_result(filename, path, pending):
+        try:
+            return filename, pending.get() if pending is not None else load_task(path)
+        except Exception as e:
+            return filename, e
+
+    parsed = parse_results([f for f in pending_files if not is_streamed(f)])
+
+    def read_stage():
+        for filename in pending_files:
+            file_path = os.path.join(INPUT_FOLDER, filename)
+            if not is_streamed(filename):
+                _, result = next(parsed)
+                if isinstance(result, Exception):
+                    failed.add(filename)
+                    yield ("failed", filename, result)
+                    continue
+                df, parse_report = result
+                read_report.merge(parse_report)
+                if df is None:
+                    report.files.pop(filename, None)
+                    continue
+                report.file(filename)["parse_wall_sec"] = parse_report.phases["parse"]["wall_sec"]
+                report.file(filename)["parse_cpu_sec"] = parse_report.phases["parse"]["cpu_sec"]
+                key_col = file_key_cols(df.columns, multi_key)
+                yield ("skip", filename) if key_col is None else ("file", filename, df, key_col)
+                continue
+
+            try:
+                key_col = file_key_cols(read_input_columns(file_path), multi_key)
+                if key_col is None:
+                    yield ("skip", filename)
+                    continue
+                chunks = read_report.iter_phase("parse", iter_input_chunks(file_path, stream_chunk_rows, logger))
+                for chunk in tqdm(chunks, desc=f"Streaming {filename}"):
+                    if filename in failed:
+                        break
+                    yield ("chunk", filename, chunk, key_col)
+            except Exception as e:
+                failed.add(filename)
+                yield ("failed", filename, e)
+                continue
+            yield ("end", filename)
+
+    # Match stage: enrich whole files batch by batch (on the pool when
+    # there is one) and streamed chunks one at a time
+    def match_file(filename, df, key_col):
+        file_report = report.file(filename)
+        file_report["key_col"] = key_col
+        file_report["rows_in"] = len(df)
+        advance = scaled_progress(report_progress, file_row_counts[filename] or 0, len(df))
+        if pool is not None:
+            completed = enrich_files_parallel(pool, [(filename, df, key_col)], advance, report=match_report,
+                                              memoize=memo is not None, max_row_fanout=max_row_fanout)
+            output_parts = [output_df for _, output_df in completed]
         else:
-            continue
+            # resolve the file's distinct keys in large batches first
+            if memo is not None:
+                memo.plan_frame(df, key_col, match_report)
+            output_parts = []
+            batch_starts = range(0, len(df), ENRICH_BATCH_ROWS)
+            for start in tqdm(batch_starts, desc=f"Processing {filename}"):
+                batch = df.iloc[start:start + ENRICH_BATCH_ROWS]
+                output_parts.append(enrich_batch(batch, lookup, key_col, report=match_report, memo=memo,
+                                                 max_row_fanout=max_row_fanout))
 
-        df = separate_by_rows(df)
+                # Batch-level progress update
+                advance(len(batch), filename)
+        advance(0, filename)
+        return pd.concat(output_parts) if output_parts else None
 
-        if 'phone_number' in df.columns:
-            df['phone_number'] = df['phone_number'].fillna('').apply(normalize_phone)
-        elif 'id' in df.columns:
-            df = df[df['id'].notna() & (df['id'].str.strip().str.lower() != 'nan') & (df['id'].str.strip() != '')]
-        elif 'BTP SN' in df.columns:
-            df = df[df['BTP SN'].notna() & (df['BTP SN'].str.strip().str.lower() != 'nan') & (df['BTP SN'].str.strip() != '')]
-            df['BTP SN'] = df['BTP SN'].str.replace(r'(?i)^TX-?', '', regex=True).str.strip()
+    def match_chunk(filename, chunk, key_col):
+        raw_rows = len(chunk)
+        if not multi_key:
+            with match_report.phase("parse"):
+                chunk = prepare_input(chunk)
+        file_report = report.file(filename)
+        file_report["key_col"] = key_col
+        file_report["rows_in"] += len(chunk)
+        output_df = None
+        if len(chunk):
+            # streamed chunks are not memoized: the memo would hold every
+            # distinct key of the file and memory would no longer be bounded
+            output_df = enrich_batch(chunk, lookup, key_col, report=match_report, max_row_fanout=max_row_fanout)
 
-        required_cols_input = ["id", "phone_number", "BTP SN"]
-        present_cols = [c for c in required_cols_input if c in df.columns]
+        # Chunk-level progress update
+        report_progress(raw_rows, filename)
+        return output_df
 
-        if not present_cols:
-            msg = f"{filename}: missing required columns {required_cols_input}"
+    matching = set()
+
+    def match_stage(item):
+        kind, filename = item[:2]
+        if filename in failed and kind != "failed":
+            return
+        if kind not in ("file", "chunk"):
+            yield item
+            return
+        if filename not in matching:
+            # the progress phase is only set on the write stage's thread,
+            # so tell it when a file's matching starts
+            matching.add(filename)
+            yield ("matching", filename)
+        try:
+            if kind == "file":
+                output = ("output", filename, match_file(filename, *item[2:]))
+            else:
+                output = ("chunk_out", filename, match_chunk(filename, *item[2:]))
+        except Exception as e:
+            failed.add(filename)
+            output = ("failed", filename, e)
+        yield output
+
+    # Write stage (on this thread): whole outputs in one go, streamed ones
+    # appended chunk by chunk, keeping the date format the first dated
+    # chunk inferred
+    streams = {}
+    written = set()
+
+    def fail(filename, error):
+        failed.add(filename)
+        if filename in failed_files:
+            return
+        failed_files.append(filename)
+        report.file(filename)["status"] = f"failed: {error}"
+        stream = streams.pop(filename, None)
+        try:
+            if stream is not None and stream["writer"] is not None:
+                stream["writer"].close()
+            if filename in written:
+                # don't leave a partial output behind
+                os.remove(output_path_for(filename))
+        except OSError:
+            pass
+        skip_progress(filename)
+        logger(f"\nFailed to process {filename}: {error}")
+        if len(files) == 1:
+            # Only one file to process → fatal
+            raise error
+
+    def write_stage(item):
+        kind, filename = item[:2]
+        if kind == "skip":
+            msg = f"{filename}: missing required columns {key_cols}"
             if len(files) == 1:
                 # Only one file to process → fatal
                 logger(f"\nError: {msg}")
                 raise RuntimeError(msg)
-            else:
-                # Multiple files → just skip
-                skipped_files.append(filename)
-                logger(f"\nSkipping {msg}")
-                continue
+            # Multiple files → just skip
+            skipped_files.append(filename)
+            report.file(filename)["status"] = "skipped: missing required columns"
+            skip_progress(filename)
+            logger(f"\nSkipping {msg}")
+            return
+        if filename in failed_files:
+            return
+        if kind == "matching":
+            progress.set_phase(PHASE_MATCH, filename)
+            return
 
-        result_rows = []
-        row_iterator = tqdm(df.iterrows(), total=len(df), desc=f"Processing {filename}")
-        for _, row in row_iterator:
-            if "id" in df.columns:
-                id = row['id']
-                row_iterator.set_description(f"id {id}")
-                ids = set(get_matching_ids(bottoms_up, id=id))
-
-            elif "phone_number" in df.columns:
-                phone = row['phone_number']
-                row_iterator.set_description(f"Phone {phone}")
-                ids = set(get_matching_ids(bottoms_up, phone=phone))
-
-            elif "BTP SN" in df.columns:
-                sn = row['BTP SN']
-                row_iterator.set_description(f"SN {sn}")
-                ids = set(get_matching_ids(bottoms_up, sn=sn))      
-
-            # Expand ids using contact_group_id
-            additional_ids = set()
-            for match_id in ids:
-                group_id = bottoms_up.loc[bottoms_up['id'] == match_id, 'contact_group_id'].dropna()
-                if not group_id.empty:
-                    group = group_id.values[0]
-                    group_matches = bottoms_up[bottoms_up['contact_group_id'] == group]['id'].dropna().tolist()
-                    additional_ids.update(group_matches)
-            all_ids = ids.union(additional_ids)
-
-            if all_ids:
-                    # Duplicate row for each matched ID
-                for matched_id in all_ids:
-                    matched_row = bottoms_up[bottoms_up['id'] == matched_id]
-                    if not matched_row.empty:
-                        matched = matched_row.iloc[0]
-                        result_rows.append(enrich_row(row, matched))
-            else:
-                # Always include row, just blank enrichment columns
-                result_rows.append(enrich_row(row, None))
-
-            # Row-level progress update
-            processed_rows += 1
-            progress_fraction = processed_rows / total_rows
-            progress_percentage = int(progress_fraction * 100)
-            if progress_callback:
-                progress_callback(progress_fraction, filename)
-
-        # Save output in the same format as input
-        if result_rows:
-                output_df = pd.DataFrame(result_rows)
-                
-                if "date_created" in output_df.columns:
-                    output_df["date_created"] = pd.to_datetime(
-                        output_df["date_created"], errors="coerce"
-                    ).dt.strftime("%Y-%m-%d").fillna("")
-
-                output_path = os.path.join(OUTPUT_FOLDER, f"output_{os.path.splitext(filename)[0]}{output_ext}")
-                if output_ext == ".xlsx":
-                    output_df.to_excel(output_path, index=False)
-                else:
-                    output_df.to_csv(output_path, index=False)
+        output_path = output_path_for(filename)
+        file_report = report.file(filename)
+        try:
+            if kind == "failed":
+                raise item[2]
+            elif kind == "output":
+                output_df = item[2]
+                # Save output in the same format as input
+                if output_df is not None:
+                    progress.set_phase(PHASE_WRITE, filename)
+                    written.add(filename)
+                    with report.phase("write"):
+                        write_output_file(output_df, output_path)
+                    file_report["rows_out"] = len(output_df)
+                finished(filename)
+            elif kind == "chunk_out":
+                output_df = item[2]
+                if output_df is None:
+                    return
+                stream = streams.setdefault(filename, {"writer": None, "date_format": None})
+                if stream["date_format"] is None:
+                    stream["date_format"] = infer_date_format(output_df["date_created"])
+                progress.set_phase(PHASE_WRITE, filename)
+                with report.phase("write"):
+                    if stream["writer"] is None:
+                        written.add(filename)
+                        stream["writer"] = open_output_stream(output_path)
+                    stream["writer"].write(finish_output(output_df, output_path, date_format=stream["date_format"],
+                                                       streamed=True))
+                file_report["rows_out"] += len(output_df)
+                # back to waiting on the file's next matched chunk
+                progress.set_phase(PHASE_MATCH, filename)
+            elif kind == "end":
+                stream = streams.pop(filename, None)
+                if stream is not None and stream["writer"] is not None:
+                    with report.phase("write"):
+                        stream["writer"].close()
+                finished(filename)
+        except Exception as e:
+            fail(filename, e)
+
+    try:
+        run_pipeline(read_stage(), [match_stage, write_stage])
+    finally:
+        report.merge(read_report)
+        report.merge(match_report)
+    progress.finish()
+
+    if report.memo["key_lookups"]:
+        logger(
+            f"Key memo: {report.memo['memo_hits']:,} of {report.memo['key_lookups']:,} key lookups served "
+            f"from memo; {report.memo['planned_keys'] + report.memo['resolved_keys']:,} distinct keys resolved"
+        )
+    if report.capped["rows"]:
+        logger(
+            f"Capped {report.capped['rows']:,} rows at max_row_fanout={max_row_fanout:,}; "
+            f"{report.capped['dropped_matches']:,} matches were left out"
+        )
+    if report.shards:
+        logger("Matched rows per shard: " + ", ".join(f"{name} {hits:,}" for name, hits in sorted(report.shards.items())))
 
     if skipped_files:
         summary_msg = "The following files were skipped due to missing required columns (`id`, `BTP SN`, or `phone_number`):\n" + "\n".join(skipped_files)
         logger("\n" + summary_msg)
 
-        if len(files) > 1:
+        if len(files) > 1 and popups:
             try:
                 from tkinter import messagebox
                 messagebox.showwarning("Skipped Files", summary_msg)
             except:
                 pass
+
+    warn_oversized()
+
+    if failed_files:
+        summary_msg = "The following files could not be processed:\n" + "\n".join(
+            f"{filename} ({report.files[filename]['status']})" for filename in failed_files
+        )
+        logger("\n" + summary_msg)
+
+        if len(files) > 1 and popups:
+            try:
+                from tkinter import messagebox
+                messagebox.showwarning("Failed Files", summary_msg)
+            except:
+                pass
             
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,66 @@
+# -------------------------ABOUT --------------------------
+
+# Column-at-a-time key normalization used by main.py.
+# Each function gives exactly the result of the per-value cleanup it
+# replaces (normalize_phone, .str.upper().str.strip(), TX- prefix removal)
+# in a single pass over the column instead of one Python-level call or
+# one pandas string pass per step.
+
+# ---------------------------------------------------------
+
+import re
+import pandas as pd
+
+
+# Separator used to join a column into one byte buffer; never a digit
+SEP = "\x00"
+# every byte except ASCII digits and SEP, deleted from the phone buffer
+_NON_DIGIT_BYTES = bytes(b for b in range(256) if not (0x30 <= b <= 0x39 or b == 0))
+_NON_DIGITS = re.compile(r"\D")
+
+
+def _as_series(values, index):
+    return pd.Series(values, index=index, dtype=object)
+
+def _strings(values):
+    """Column values as a list, with anything that is not a str as ""."""
+    values = values.tolist()
+    if pd.api.types.infer_dtype(values, skipna=False) == "string":
+        return values
+    return [v if isinstance(v, str) else "" for v in values]
+
+
+def normalize_phones(values):
+    """normalize_phone over a whole Series: digits only, leading 1 of an
+    11-digit number dropped, "" for anything that is not a string."""
+    strings = _strings(values)
+    joined = SEP.join(strings)
+    if joined.isascii() and joined.count(SEP) == max(len(strings) - 1, 0):
+        # ASCII column: strip non-digits from one byte buffer
+        digits = joined.encode("ascii").translate(None, _NON_DIGIT_BYTES).decode("ascii").split(SEP)
+    else:
+        # \D also keeps non-ASCII digits, so fall back to the regex per value
+        digits = [_NON_DIGITS.sub("", v) for v in strings]
+    return _as_series(
+        [d[1:] if len(d) == 11 and d[0] == "1" else d for d in digits] if strings else [],
+        values.index
+    )
+
+def normalize_ids(values):
+    """values.astype(str).str.upper().str.strip() in one pass.
+
+    Also the final cleanup of every input key column before matching."""
+    return _as_series([v.upper().strip() for v in values.astype(str).tolist()], values.index)
+
+def normalize_serials(values):
+    """Input BTP SN cleanup: drop a leading "TX"/"TX-" (any case), then strip.
+    Values that are not strings become NaN, as with the .str methods."""
+    cleaned = []
+    for v in values.tolist():
+        if not isinstance(v, str):
+            cleaned.append(float("nan"))
+            continue
+        if v[:2].upper() == "TX":
+            v = v[3:] if v[2:3] == "-" else v[2:]
+        cleaned.append(v.strip())
+    return _as_series(cleaned, values.index)
@@ -0,0 +1,85 @@
+# -------------------------ABOUT --------------------------
+
+# Staged pipeline for main.py runs: a source and every stage but the last
+# run on threads of their own, connected by bounded queues, so one file
+# can be parsed while the previous one is matched and the one before it
+# written. A full queue holds the stage feeding it back, which keeps the
+# number of frames in flight (and memory) bounded.
+
+# ---------------------------------------------------------
+
+import queue
+import threading
+
+
+# items each queue between two stages holds before the producer waits
+PIPELINE_QUEUE_ITEMS = 2
+# how often a blocked stage checks whether the pipeline was stopped (s)
+PIPELINE_POLL_SEC = 0.1
+
+_DONE = object()
+
+
+def run_pipeline(source, stages, queue_items=PIPELINE_QUEUE_ITEMS):
+    """Pass the items of source through stages.
+
+    Each stage is called with one item and returns an iterable of items
+    for the next stage (or None). source and every stage except the last
+    run on their own thread; the last one runs on the calling thread. An
+    exception in any of them stops the whole pipeline and is re-raised
+    here, so stages report per-item errors by passing them on as items.
+    """
+    queues = [queue.Queue(queue_items) for _ in stages]
+    stop = threading.Event()
+    errors = []
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=PIPELINE_POLL_SEC)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def items_from(q):
+        while not stop.is_set():
+            try:
+                item = q.get(timeout=PIPELINE_POLL_SEC)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def feed(items, q):
+        try:
+            for item in items:
+                if not put(q, item):
+                    return
+            put(q, _DONE)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def run_stage(stage, q_in, q_out):
+        def outputs():
+            for item in items_from(q_in):
+                yield from stage(item) or ()
+        feed(outputs(), q_out)
+
+    threads = [threading.Thread(target=feed, args=(source, queues[0]), daemon=True)]
+    for i, stage in enumerate(stages[:-1]):
+        threads.append(threading.Thread(target=run_stage, args=(stage, queues[i], queues[i + 1]), daemon=True))
+    for thread in threads:
+        thread.start()
+    try:
+        for item in items_from(queues[-1]):
+            for _ in stages[-1](item) or ():
+                pass
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,158 @@
+# -------------------------ABOUT --------------------------
+
+# Throttled progress/telemetry for main.py runs.
+# ProgressTracker turns row counts into rate-limited ProgressEvents;
+# ProgressQueue hands events and log lines from the worker thread to the
+# Tk main loop, which drains it with after().
+
+# ---------------------------------------------------------
+
+import queue
+import threading
+import time
+from collections import namedtuple
+
+
+# Phases reported while a run is going
+PHASE_LOAD_DB = "load DB"
+PHASE_PREFLIGHT = "preflight"
+PHASE_PARSE = "parse"
+PHASE_MATCH = "match"
+PHASE_WRITE = "write"
+
+# at most one event per PROGRESS_MIN_INTERVAL seconds and per
+# 1 / PROGRESS_STEPS of the total rows, unless the phase or file changes
+PROGRESS_MIN_INTERVAL = 0.1
+PROGRESS_STEPS = 1000
+
+ProgressEvent = namedtuple(
+    "ProgressEvent",
+    ["fraction", "rows_done", "total_rows", "rows_per_sec", "eta_sec", "phase", "filename"]
+)
+
+
+class ProgressTracker:
+    """Count processed rows and emit throttled ProgressEvents.
+
+    Every listener is called with each emitted event. Safe to call from
+    any thread.
+    """
+
+    def __init__(self, listeners=(), min_interval=PROGRESS_MIN_INTERVAL, min_rows=None, clock=time.monotonic):
+        self.listeners = [listener for listener in listeners if listener is not None]
+        self.min_interval = min_interval
+        self.min_rows = min_rows
+        self.clock = clock
+        self.total_rows = 0
+        self.rows_done = 0
+        self.phase = None
+        self.filename = None
+        self._lock = threading.Lock()
+        self._started = None
+        self._last_time = None
+        self._last_rows = 0
+
+    def start(self, total_rows):
+        """Set the row total and restart the rows/sec clock."""
+        with self._lock:
+            self.total_rows = total_rows
+            self.rows_done = 0
+            self._started = self.clock()
+            self._last_time = None
+            self._last_rows = 0
+
+    def set_phase(self, phase, filename=None):
+        """Switch phase (and file), emitting an event when either changes."""
+        with self._lock:
+            if phase == self.phase and filename in (None, self.filename):
+                return
+            self.phase = phase
+            if filename is not None:
+                self.filename = filename
+            event = self._event()
+        self._emit(event)
+
+    def advance(self, rows, filename=None):
+        """Add processed rows; emits only when the rate limits allow it."""
+        with self._lock:
+            self.rows_done += rows
+            if filename is not None and filename != self.filename:
+                self.filename = filename
+            elif not self._due():
+                return
+            event = self._event()
+        self._emit(event)
+
+    def finish(self):
+        """Emit the final event regardless of the rate limits."""
+        with self._lock:
+            event = self._event()
+        self._emit(event)
+
+    def _due(self):
+        min_rows = self.min_rows
+        if min_rows is None:
+            min_rows = max(self.total_rows // PROGRESS_STEPS, 1)
+        if self.rows_done - self._last_rows < min_rows and self.rows_done < self.total_rows:
+            return False
+        return self._last_time is None or self.clock() - self._last_time >= self.min_interval
+
+    def _event(self):
+        now = self.clock()
+        self._last_time = now
+        self._last_rows = self.rows_done
+
+        elapsed = now - self._started if self._started is not None else 0
+        rows_per_sec = self.rows_done / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total_rows - self.rows_done, 0)
+        eta_sec = remaining / rows_per_sec if rows_per_sec > 0 else None
+        fraction = min(self.rows_done / self.total_rows, 1.0) if self.total_rows else 0.0
+        return ProgressEvent(fraction, self.rows_done, self.total_rows, rows_per_sec, eta_sec,
+                             self.phase, self.filename)
+
+    def _emit(self, event):
+        for listener in self.listeners:
+            listener(event)
+
+
+class ProgressQueue:
+    """Thread-safe hand-off of progress events and log lines to a UI thread.
+
+    The worker side calls put() / log(); the UI side calls drain() from
+    its own loop (e.g. Tk's after()), which returns the pending log lines
+    and only the newest progress event.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def put(self, event):
+        self._queue.put(("progress", event))
+
+    def log(self, message):
+        self._queue.put(("log", message))
+
+    def drain(self):
+        messages = []
+        latest = None
+        while True:
+            try:
+                kind, item = self._queue.get_nowait()
+            except queue.Empty:
+                return messages, latest
+            if kind == "log":
+                messages.append(item)
+            else:
+                latest = item
+
+
+def format_eta(seconds):
+    """Short h:mm:ss / m:ss text for an ETA in seconds ("" when unknown)."""
+    if seconds is None:
+        return ""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,229 @@
+# -------------------------ABOUT --------------------------
+
+# Structured per-run performance report written by main() to the results
+# folder: wall time and thread CPU time per phase, peak memory, rows
+# in/out per file, hit/miss counts per key type, the contact-group fan-out
+# distribution, matches dropped by the fan-out cap and, for sharded
+# databases, the matched rows each shard produced.
+
+# ---------------------------------------------------------
+
+import io
+import json
+import os
+import pstats
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+
+REPORT_PREFIX = "run_report_"
+# functions listed in the report when profiling
+PROFILE_TOP_FUNCTIONS = 25
+
+
+def peak_memory():
+    """Peak resident memory of this process (and its largest finished
+    worker), in bytes; None where the platform does not expose it."""
+    try:
+        import resource
+    except ImportError:
+        return {"process_bytes": _windows_peak_memory(), "workers_bytes": None}
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "process_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "workers_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale or None,
+    }
+
+def _windows_peak_memory():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        return None
+
+
+def fanout_summary(fanout):
+    """Percentiles of a {ids per matched row: row count} distribution."""
+    if not fanout:
+        return {}
+    values = np.array(sorted(fanout), dtype=np.int64)
+    weights = np.array([fanout[v] for v in values], dtype=np.int64)
+    cumulative = np.cumsum(weights)
+    summary = {"rows": int(cumulative[-1]), "mean": round(float((values * weights).sum() / cumulative[-1]), 3)}
+    for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        summary[name] = int(values[np.searchsorted(cumulative, q * cumulative[-1])])
+    summary["max"] = int(values[-1])
+    return summary
+
+
+class RunReport:
+    """Collects timings and match statistics for one main() run.
+
+    Worker processes fill their own RunReport and the parent merge()s it,
+    so phase times of parallel runs are summed across processes.
+    """
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self.started = datetime.now()
+        self.status = "ok"
+        self.phases = {}
+        self.files = {}
+        self.keys = {}
+        self.fanout = Counter()
+        self.memo = Counter()
+        self.shards = Counter()
+        self.capped = Counter()
+        self.hot_functions = None
+        self.profile_path = None
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block (wall and CPU) under a phase name.
+
+        CPU is that of the calling thread only: the pipeline stages run on
+        threads of their own, and process-wide CPU would charge each phase
+        with the others' work. Work the block hands to other threads (e.g.
+        shards loaded in parallel) counts in the run's cpu_sec only.
+        """
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def iter_phase(self, name, iterable):
+        """Yield from iterable, timing each step under a phase name."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def add_phase(self, name, wall_sec, cpu_sec, calls=1):
+        entry = self.phases.setdefault(name, {"wall_sec": 0.0, "cpu_sec": 0.0, "calls": 0})
+        entry["wall_sec"] += wall_sec
+        entry["cpu_sec"] += cpu_sec
+        entry["calls"] += calls
+
+    def file(self, filename):
+        """The per-file entry, created on first use."""
+        return self.files.setdefault(filename, {
+            "status": "processed", "key_col": None, "rows_in": 0, "rows_out": 0,
+            "parse_wall_sec": 0.0, "parse_cpu_sec": 0.0,
+        })
+
+    def count_matches(self, key_col, blank_rows, ids_per_row, fanout=True):
+        """Record hits/misses for a batch; ids_per_row holds the number of
+        matched ids (after group expansion) of every non-blank input row."""
+        entry = self.keys.setdefault(key_col, {"rows": 0, "blank": 0, "hits": 0, "misses": 0})
+        hits = int(np.count_nonzero(ids_per_row))
+        entry["rows"] += blank_rows + len(ids_per_row)
+        entry["blank"] += blank_rows
+        entry["hits"] += hits
+        entry["misses"] += len(ids_per_row) - hits
+        if fanout:
+            self.count_fanout(ids_per_row)
+
+    def count_fanout(self, ids_per_row):
+        """Add the matched rows' id counts to the fan-out distribution."""
+        values, counts = np.unique(ids_per_row[ids_per_row > 0], return_counts=True)
+        self.fanout.update(dict(zip(values.tolist(), counts.tolist())))
+
+    def count_shards(self, shards):
+        """Add one matched output row per entry of shards (shard names)."""
+        names, counts = np.unique(np.asarray(shards, dtype=str), return_counts=True)
+        self.shards.update(dict(zip(names.tolist(), counts.tolist())))
+
+    def count_capped(self, rows, matches):
+        """Record rows whose matches were cut at max_row_fanout."""
+        self.capped["rows"] += rows
+        self.capped["dropped_matches"] += matches
+
+    def merge(self, other):
+        """Add another report's phases and match statistics to this one."""
+        for name, entry in other.phases.items():
+            self.add_phase(name, entry["wall_sec"], entry["cpu_sec"], entry["calls"])
+        for key_col, entry in other.keys.items():
+            mine = self.keys.setdefault(key_col, {"rows": 0, "blank": 0, "hits": 0, "misses": 0})
+            for field, value in entry.items():
+                mine[field] += value
+        self.fanout.update(other.fanout)
+        self.memo.update(other.memo)
+        self.shards.update(other.shards)
+        self.capped.update(other.capped)
+
+    def add_profile(self, profiler, folder):
+        """Dump a cProfile run next to the report and keep its hottest functions."""
+        self.profile_path = os.path.join(folder, f"run_profile_{self.started:%Y%m%d_%H%M%S}.prof")
+        profiler.dump_stats(self.profile_path)
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                "function": f"{os.path.basename(filename)}:{line}({function})",
+                "calls": calls,
+                "total_sec": round(total, 4),
+                "cumulative_sec": round(cumulative, 4),
+            })
+        rows.sort(key=lambda row: row["cumulative_sec"], reverse=True)
+        self.hot_functions = rows[:PROFILE_TOP_FUNCTIONS]
+
+    def to_dict(self):
+        def rounded(entry):
+            return {k: round(v, 4) if isinstance(v, float) else v for k, v in entry.items()}
+
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "status": self.status,
+            "settings": self.settings,
+            "wall_sec": round(time.perf_counter() - self._wall_start, 4),
+            "cpu_sec": round(time.process_time() - self._cpu_start, 4),
+            "peak_memory": peak_memory(),
+            "phases": {name: rounded(entry) for name, entry in self.phases.items()},
+            "files": {name: rounded(entry) for name, entry in self.files.items()},
+            "keys": self.keys,
+            "memo": dict(self.memo),
+            "shard_hits": dict(sorted(self.shards.items())),
+            "fanout_cap": dict(self.capped),
+            "group_fanout": {
+                "distribution": {str(k): v for k, v in sorted(self.fanout.items())},
+                "summary": fanout_summary(self.fanout),
+            },
+            "profile": None if self.profile_path is None else {
+                "path": self.profile_path, "hot_functions": self.hot_functions,
+            },
+        }
+
+    def write(self, folder):
+        """Write the report as JSON into folder and return its path."""
+        path = os.path.join(folder, f"{REPORT_PREFIX}{self.started:%Y%m%d_%H%M%S}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
@@ -0,0 +1,278 @@
+# -------------------------ABOUT --------------------------
+
+# Streaming readers/writers used by main.py for inputs and outputs that are
+# too large to hold in memory as one DataFrame.
+
+# ---------------------------------------------------------
+
+import os
+
+import numpy as np
+from pandas.io.parsers import TextParser
+
+
+# Excel sheet limit, including the header row
+EXCEL_MAX_ROWS = 1_048_576
+
+
+# ----------------------- EXCEL INPUT -----------------------
+def _convert_cell(cell):
+    """Cell value as pandas' openpyxl reader returns it."""
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    if cell.value is None:
+        return ""
+    elif cell.data_type == TYPE_ERROR:
+        return np.nan
+    elif cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        if val == cell.value:
+            return val
+        return float(cell.value)
+    return cell.value
+
+def _parse_rows(header, rows):
+    width = len(header)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    return TextParser([header] + rows, header=0, dtype=str, skip_blank_lines=False).read()
+
+def count_excel_rows(file_path):
+    """Data-row count of the first sheet from its stored dimensions (cheap)."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        max_row = wb.worksheets[0].max_row
+        if max_row is None:
+            max_row = sum(1 for _ in wb.worksheets[0].iter_rows(values_only=True))
+        return max(max_row - 1, 0)
+    finally:
+        wb.close()
+
+def count_columnar_rows(file_path):
+    """Row count of a Parquet (from its footer) or Feather file (needs pyarrow)."""
+    if file_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(file_path).metadata.num_rows
+    import pyarrow as pa
+
+    with pa.memory_map(file_path) as source:
+        reader = pa.ipc.open_file(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+def read_columnar_columns(file_path):
+    """Column names of a Parquet or Feather file, read from its schema."""
+    if file_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(file_path).names
+    import pyarrow as pa
+
+    with pa.memory_map(file_path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+def iter_columnar_chunks(file_path, chunk_rows):
+    """Yield a Parquet or Feather file as typed DataFrames of up to chunk_rows rows."""
+    import pyarrow as pa
+
+    if file_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(file_path)
+        # the file's schema carries the pandas metadata (index, dtypes)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            yield pa.Table.from_batches([batch], schema=parquet_file.schema_arrow).to_pandas()
+        return
+    with pa.memory_map(file_path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for start in range(0, batch.num_rows, chunk_rows):
+                yield pa.Table.from_batches([batch.slice(start, chunk_rows)], schema=reader.schema).to_pandas()
+
+def _sheet_width(sheet):
+    """Cells in the widest row of a sheet, not counting trailing empty ones."""
+    width = 0
+    for values in sheet.iter_rows(values_only=True):
+        filled = [i for i, value in enumerate(values) if value is not None and value != ""]
+        if filled:
+            width = max(width, filled[-1] + 1)
+    return width
+
+def iter_excel_chunks(file_path, chunk_rows, logger=None):
+    """Yield the first sheet of an .xlsx file as DataFrames of up to chunk_rows rows.
+
+    Rows are read with openpyxl's read-only iterator and parsed the way
+    pd.read_excel(file_path, dtype=str) parses them, so concatenating the
+    chunks gives the same frame. Like pandas, rows wider than the header
+    add "Unnamed: N" columns; the width is checked up front (with an extra
+    pass over the sheet when its stored dimensions are wider than the
+    header or missing). Cells past that width, which only a sheet with
+    wrong stored dimensions can have, are left out and logged.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = wb.worksheets[0]
+        stored_width = sheet.max_column
+        sheet.reset_dimensions()
+        header = None
+        rows = []
+        blank_rows = []  # held back: trailing empty rows are dropped
+        yielded = False
+        cut_rows = 0
+        for row in sheet.rows:
+            converted = [_convert_cell(cell) for cell in row]
+            while converted and converted[-1] == "":
+                converted.pop()
+            if header is None:
+                width = len(converted)
+                if stored_width is None or stored_width > width:
+                    width = max(_sheet_width(sheet), width)
+                header = converted + [""] * (width - len(converted))
+                continue
+            if len(converted) > len(header):
+                cut_rows += 1
+                converted = converted[:len(header)]
+            if not converted:
+                blank_rows.append(converted)
+                continue
+            rows.extend(blank_rows)
+            blank_rows = []
+            rows.append(converted)
+            if len(rows) >= chunk_rows:
+                yield _parse_rows(header, rows)
+                yielded = True
+                rows = []
+        if header is not None and (rows or not yielded):
+            yield _parse_rows(header, rows)
+        if cut_rows and logger is not None:
+            logger(f"{os.path.basename(file_path)}: left out the cells past column {len(header)} "
+                   f"in {cut_rows:,} row(s)")
+    finally:
+        wb.close()
+
+
+# ----------------------- OUTPUT -----------------------
+class CsvStreamWriter:
+    """Append frames to a CSV file, writing the header once."""
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.rows_written = 0
+
+    def write(self, df):
+        df.to_csv(self.output_path, index=False, mode="a" if self.rows_written else "w",
+                  header=not self.rows_written)
+        self.rows_written += len(df)
+
+    def close(self):
+        pass
+
+
+class ExcelStreamWriter:
+    """Append frames to a write-only .xlsx workbook.
+
+    Rows are flushed as they are appended instead of building the workbook
+    in memory. When a sheet reaches Excel's row limit the output continues
+    on Sheet2, Sheet3, ... each with its own header row.
+    """
+
+    def __init__(self, output_path, max_rows=EXCEL_MAX_ROWS):
+        from openpyxl import Workbook
+
+        self.output_path = output_path
+        self.max_rows = max_rows
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+        self.sheet_count = 0
+        self.rows_written = 0
+        self.columns = None
+
+    def _header_row(self):
+        # same look as DataFrame.to_excel headers
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Border, Font, Side
+
+        thin = Side(style="thin")
+        cells = []
+        for name in self.columns:
+            cell = WriteOnlyCell(self.sheet, value=name)
+            cell.font = Font(bold=True)
+            cell.border = Border(top=thin, right=thin, bottom=thin, left=thin)
+            cell.alignment = Alignment(horizontal="center", vertical="top")
+            cells.append(cell)
+        return cells
+
+    def _new_sheet(self):
+        self.sheet_count += 1
+        self.sheet = self.workbook.create_sheet(f"Sheet{self.sheet_count}")
+        self.sheet.append(self._header_row())
+        self.sheet_rows = 1
+
+    def write(self, df):
+        if self.columns is None:
+            self.columns = [str(c) for c in df.columns]
+        for values in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+            if self.sheet is None or self.sheet_rows >= self.max_rows:
+                self._new_sheet()
+            self.sheet.append(values)
+            self.sheet_rows += 1
+            self.rows_written += 1
+
+    def close(self):
+        if self.sheet is None:
+            return
+        self.workbook.save(self.output_path)
+
+
+class ArrowStreamWriter:
+    """Append frames to a Parquet or Feather file as they come (needs pyarrow).
+
+    The first frame fixes the schema; later frames are cast to it, so a
+    column that is all blank in one chunk keeps the type of the first. A
+    column with no value at all in the first frame is typed as text.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.writer = None
+        self.schema = None
+        self.rows_written = 0
+
+    def write(self, df):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.schema = pa.schema(
+                [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema],
+                metadata=table.schema.metadata,
+            )
+            table = table.cast(self.schema)
+            if self.output_path.endswith(".feather"):
+                self.writer = pa.ipc.new_file(self.output_path, self.schema)
+            else:
+                import pyarrow.parquet as pq
+
+                self.writer = pq.ParquetWriter(self.output_path, self.schema)
+        elif not table.schema.equals(self.schema):
+            table = table.cast(self.schema)
+        self.writer.write_table(table)
+        self.rows_written += len(df)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_output_stream(output_path):
+    """Return a streaming writer matching the output file extension."""
+    if output_path.endswith(".xlsx"):
+        return ExcelStreamWriter(output_path)
+    if output_path.endswith((".parquet", ".feather")):
+        return ArrowStreamWriter(output_path)
+    return CsvStreamWriter(output_path)
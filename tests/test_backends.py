@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def write_bottoms_up_db(db_path, rows):
+    frame = pd.DataFrame([{col: row.get(col) for col in main.bottoms_up_cols} for row in rows])
+    conn = sqlite3.connect(db_path)
+    try:
+        frame.to_sql("bottoms_up", conn, index=False)
+    finally:
+        conn.close()
+
+
+def run_folders(tmp_path, shards):
+    """Input, output and database folders with one phone input file; shards
+    is a list of row lists, one .db file each."""
+    folders = {name: tmp_path / name for name in ["in", "out", "db"]}
+    for folder in folders.values():
+        folder.mkdir()
+    for number, rows in enumerate(shards):
+        write_bottoms_up_db(folders["db"] / f"shard_{number}.db", rows)
+    pd.DataFrame({"phone_number": ["0123456789", "(555) 010-0199", "999"]}).to_csv(
+        folders["in"] / "phones.csv", index=False
+    )
+    return folders
+
+
+ROWS = [
+    {"id": "BU1", "phone1": "0123456789", "Owner": "Leading Zero", "date_created": "2024-01-05"},
+    {"id": "BU2", "phone2": "5550100199", "Owner": "Plain", "date_created": "2024-01-06"},
+]
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "snapshot"])
+@pytest.mark.parametrize("shards", [[ROWS], [ROWS[:1], ROWS[1:]]], ids=["single", "sharded"])
+def test_leading_zero_phone_matches_on_every_backend(tmp_path, backend, shards):
+    folders = run_folders(tmp_path, shards)
+    main.main(INPUT_FOLDER=str(folders["in"]), OUTPUT_FOLDER=str(folders["out"]),
+              BOTTOMS_UP_FOLDER=str(folders["db"]), logger=lambda message: None, backend=backend, report=False)
+
+    output = pd.read_csv(folders["out"] / "output_phones.csv", dtype=str).fillna("")
+    assert output["id"].tolist() == ["BU1", "BU2", ""]
+    assert output["Owner"].tolist() == ["Leading Zero", "Plain", ""]
+
+
+def test_mixed_date_formats_match_across_backends(tmp_path):
+    # the database's first date has another format than the output's first
+    rows = [{"id": "BU0", "date_created": "01/07/2024"}] + ROWS
+    outputs = {}
+    for backend in ["sqlite", "memory", "snapshot"]:
+        (tmp_path / backend).mkdir()
+        folders = run_folders(tmp_path / backend, [rows])
+        main.main(INPUT_FOLDER=str(folders["in"]), OUTPUT_FOLDER=str(folders["out"]),
+                  BOTTOMS_UP_FOLDER=str(folders["db"]), logger=lambda message: None, backend=backend, report=False)
+        outputs[backend] = pd.read_csv(folders["out"] / "output_phones.csv", dtype=str).fillna("")
+    assert outputs["sqlite"]["date_created"].tolist() == ["2024-01-05", "2024-01-06", ""]
+    assert outputs["memory"].equals(outputs["sqlite"])
+    assert outputs["snapshot"].equals(outputs["sqlite"])
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "snapshot"])
+def test_unmatched_ids_resolve_to_nothing(tmp_path, backend):
+    folders = run_folders(tmp_path, [ROWS])
+    lookup = main.open_lookup(str(folders["db"]), backend, logger=lambda message: None)
+    assert main.resolve_keys(lookup, "id", ["NOPE"]).empty
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "snapshot"])
+@pytest.mark.parametrize("shards", [[ROWS], [ROWS[:1], ROWS[1:]]], ids=["single", "sharded"])
+def test_get_matching_ids_on_every_backend(tmp_path, backend, shards):
+    folders = run_folders(tmp_path, shards)
+    lookup = main.open_lookup(str(folders["db"]), backend, logger=lambda message: None)
+    assert main.get_matching_ids(lookup, id=" bu2 ") == ["BU2"]
+    assert sorted(main.get_matching_ids(lookup, id="BU1", phone="5550100199")) == ["BU1", "BU2"]
+    assert main.get_matching_ids(lookup, phone="0123456789") == ["BU1"]
+    assert main.get_matching_ids(lookup, id="NOPE", phone="999", sn="X") == []
+
+
+def test_sqlite_leaves_the_database_untouched(tmp_path):
+    folders = run_folders(tmp_path, [ROWS])
+    db_path = folders["db"] / "shard_0.db"
+    before = main.file_fingerprint(str(db_path))
+    for _ in range(2):
+        main.main(INPUT_FOLDER=str(folders["in"]), OUTPUT_FOLDER=str(folders["out"]),
+                  BOTTOMS_UP_FOLDER=str(folders["db"]), logger=lambda message: None, backend="sqlite", report=False)
+    assert main.file_fingerprint(str(db_path)) == before
+    assert (folders["db"] / main.SQLITE_KEYS_NAME).exists()
+
+
+def test_sqlite_queries_unindexed_without_a_writable_key_index(tmp_path):
+    rows = ROWS + [
+        {"id": "BU3", "contact_group_id": 7, "Serial Number": "SN-3", "phone1": "5550100199"},
+        {"id": " bu4", "contact_group_id": 7, "Owner": "Grouped"},
+    ]
+    db_path = str(tmp_path / "bottoms_up.db")
+    write_bottoms_up_db(db_path, rows)
+    indexed = main.SqliteLookup(db_path, str(tmp_path / "keys.sqlite"), logger=lambda message: None)
+    unindexed = main.SqliteLookup(db_path, str(tmp_path / "missing" / "keys.sqlite"), logger=lambda message: None)
+    assert indexed.keys_path is not None and unindexed.keys_path is None
+
+    def same(frame, other):
+        columns = list(frame.columns)
+        return frame.sort_values(columns).reset_index(drop=True).equals(other.sort_values(columns).reset_index(drop=True))
+
+    for key_col, keys in [("id", ["BU1", "BU4", "NOPE"]), ("phone_number", ["5550100199", "0123456789"]),
+                          ("BTP SN", ["SN-3", "X"])]:
+        assert same(indexed.match_keys(key_col, keys), unindexed.match_keys(key_col, keys))
+    ids = ["BU1", "BU2", "BU3", "BU4"]
+    assert same(indexed.group_pairs(ids), unindexed.group_pairs(ids))
+    assert sorted(unindexed.group_pairs(ids)["member_id"]) == ["BU3", "BU3", "BU4", "BU4"]
+    assert indexed.get_records(ids).equals(unindexed.get_records(ids))
+
+
+def test_switching_backend_reprocesses_every_file(tmp_path):
+    folders = run_folders(tmp_path, [ROWS])
+
+    def run(backend):
+        messages = []
+        main.main(INPUT_FOLDER=str(folders["in"]), OUTPUT_FOLDER=str(folders["out"]),
+                  BOTTOMS_UP_FOLDER=str(folders["db"]), logger=messages.append, backend=backend, report=False)
+        return "All files are up to date; nothing to process." in messages
+
+    assert not run("memory")
+    assert run("memory")
+    assert not run("sqlite")
+    assert run("sqlite")
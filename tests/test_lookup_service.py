@@ -0,0 +1,47 @@
+import http.client
+import os
+import sys
+import urllib.error
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lookup_service
+from test_backends import ROWS, run_folders
+
+
+@pytest.fixture
+def service(tmp_path):
+    folders = run_folders(tmp_path, [ROWS])
+    server = lookup_service.start_service(str(folders["db"]), port=0, logger=lambda message: None)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_lookup_matches_like_an_input_file(service):
+    rows = lookup_service.request_lookup(service.url, "phone_number", ["(555) 010-0199", "999"])
+    assert list(rows["row"]) == [0, 1]
+    assert rows.loc[0, "id"] == "BU2"
+    assert rows.loc[1, "id"] in (None, "")
+
+
+def test_unknown_key_col_is_a_bad_request(service):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        lookup_service.request_lookup(service.url, "owner", ["BU1"])
+    assert error.value.code == 400
+
+
+def test_oversized_body_is_refused_before_it_is_read(service):
+    host, port = service.server_address[:2]
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        # announce a body far over the limit but send none of it: a handler
+        # that read first would block here until the timeout
+        conn.putrequest("POST", "/lookup")
+        conn.putheader("Content-Length", str(lookup_service.SERVICE_MAX_BYTES + 1))
+        conn.endheaders()
+        assert conn.getresponse().status == 413
+    finally:
+        conn.close()
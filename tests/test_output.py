@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from test_backends import ROWS, write_bottoms_up_db
+
+
+def test_typed_output_writes_is_latest_offer_as_nullable_integers():
+    text = main.typed_output(pd.DataFrame({"is_latest_offer": [1.0, 0.0, ""]}, dtype=object))
+    assert text["is_latest_offer"].dtype == "Int64"
+    assert text["is_latest_offer"].tolist() == [1, 0, pd.NA]
+
+    floats = main.typed_output(pd.DataFrame({"is_latest_offer": [1.0, float("nan")]}))
+    assert floats["is_latest_offer"].dtype == "Int64"
+
+    # anything but whole numbers stays text
+    words = main.typed_output(pd.DataFrame({"is_latest_offer": ["yes", ""]}, dtype=object))
+    assert words["is_latest_offer"].tolist() == ["yes", None]
+
+
+def test_streamed_parquet_keeps_one_schema_when_the_first_chunk_has_no_matches(tmp_path):
+    for name in ["in", "out", "db"]:
+        (tmp_path / name).mkdir()
+    rows = ROWS + [{"id": "BU3", "phone1": "5550100300", "# of Interests": "2", "is_latest_offer": 1.0,
+                    "date_created": "2024-02-01"}]
+    write_bottoms_up_db(tmp_path / "db" / "bottoms_up.db", rows)
+    phones = ["1"] * 5 + ["0123456789", "5550100300", "5550100199"]
+    pd.DataFrame({"phone_number": phones}).to_csv(tmp_path / "in" / "phones.csv", index=False)
+    main.main(INPUT_FOLDER=str(tmp_path / "in"), OUTPUT_FOLDER=str(tmp_path / "out"),
+              BOTTOMS_UP_FOLDER=str(tmp_path / "db"), logger=lambda message: None, stream_csv=True,
+              stream_chunk_rows=5, output_format="parquet", report=False)
+
+    output = pd.read_parquet(tmp_path / "out" / "output_phones.parquet")
+    assert output["id"].tolist() == [None] * 5 + ["BU1", "BU3", "BU2"]
+    assert output["Owner"].tolist() == [None] * 5 + ["Leading Zero", None, "Plain"]
+    assert output["# of Interests"].dtype == "Float64"
+    assert output["is_latest_offer"].tolist()[5:] == [pd.NA, 1, pd.NA]
+    assert output["date_created"].dtype == "datetime64[ns]"
@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from run_report import RunReport
+from test_backends import ROWS, run_folders
+
+
+def run(folders, **options):
+    messages = []
+    main.main(INPUT_FOLDER=str(folders["in"]), OUTPUT_FOLDER=str(folders["out"]),
+              BOTTOMS_UP_FOLDER=str(folders["db"]), logger=messages.append, report=False, **options)
+    return "\n".join(messages)
+
+
+def test_files_all_over_max_file_rows_are_reported(tmp_path):
+    folders = run_folders(tmp_path, [ROWS])
+    pd.DataFrame({"id": ["BU1", "BU2"]}).to_csv(folders["in"] / "ids.csv", index=False)
+    log = run(folders, max_file_rows=1)
+    assert "skipped because their output would exceed 1 rows" in log
+    assert "ids.csv" in log and "phones.csv" in log
+    assert "No rows to process." not in log
+
+
+def test_phase_cpu_time_is_that_of_the_calling_thread():
+    report = RunReport()
+    busy = threading.Event()
+
+    def spin():
+        while not busy.is_set():
+            pass
+
+    spinner = threading.Thread(target=spin)
+    spinner.start()
+    try:
+        with report.phase("idle"):
+            busy.wait(0.3)
+    finally:
+        busy.set()
+        spinner.join()
+    assert report.phases["idle"]["cpu_sec"] < 0.1
+
+
+def test_spawned_workers_map_the_snapshot_instead_of_the_memory_index(tmp_path, monkeypatch):
+    folders = run_folders(tmp_path, [ROWS])
+    run(folders)
+    expected = pd.read_csv(folders["out"] / "output_phones.csv", dtype=str)
+
+    # as on Windows: no fork
+    monkeypatch.setattr(main.multiprocessing, "get_all_start_methods", lambda: ["spawn"])
+    (folders["out"] / "output_phones.csv").unlink()
+    log = run(folders, workers=2, incremental=False)
+    assert "Sharing the bottoms_up snapshot with 2 worker processes." in log
+    assert (folders["db"] / main.SNAPSHOT_DIR_NAME).is_dir()
+    pd.testing.assert_frame_equal(pd.read_csv(folders["out"] / "output_phones.csv", dtype=str), expected)
+
+
+def test_file_skipped_for_missing_columns_is_not_recorded_as_done(tmp_path):
+    folders = run_folders(tmp_path, [ROWS])
+    pd.DataFrame({"name": ["x"]}).to_csv(folders["in"] / "names.csv", index=False)
+    assert "Skipping names.csv: missing required columns" in run(folders)
+    log = run(folders)
+    assert "Skipping 1 unchanged file(s): phones.csv" in log
+    assert "Skipping names.csv: missing required columns" in log
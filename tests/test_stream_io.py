@@ -0,0 +1,46 @@
+import os
+import re
+import sys
+import zipfile
+
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_io import iter_excel_chunks
+
+
+def write_ragged_sheet(path):
+    wb = Workbook()
+    sheet = wb.active
+    for row in [["id", "name"], ["BU1", "a"], ["BU2", "b", None, "x"], ["BU3"], [None], ["BU4", None, "y"]]:
+        sheet.append(row)
+    wb.save(path)
+
+
+def test_ragged_sheet_streams_like_read_excel(tmp_path):
+    path = str(tmp_path / "ragged.xlsx")
+    write_ragged_sheet(path)
+    streamed = pd.concat(iter_excel_chunks(path, 2), ignore_index=True)
+    expected = pd.read_excel(path, dtype=str)
+    assert list(streamed.columns) == ["id", "name", "Unnamed: 2", "Unnamed: 3"]
+    pd.testing.assert_frame_equal(streamed, expected)
+
+
+def test_cells_past_a_wrong_stored_dimension_are_left_out(tmp_path):
+    path = str(tmp_path / "ragged.xlsx")
+    write_ragged_sheet(path)
+    # claim the sheet is only as wide as its header
+    fixed = str(tmp_path / "narrow.xlsx")
+    with zipfile.ZipFile(path) as source, zipfile.ZipFile(fixed, "w") as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                data = re.sub(rb'<dimension ref="[^"]*"', b'<dimension ref="A1:B6"', data)
+            target.writestr(item, data)
+    messages = []
+    streamed = pd.concat(iter_excel_chunks(fixed, 2, logger=messages.append), ignore_index=True)
+    assert list(streamed.columns) == ["id", "name"]
+    pd.testing.assert_frame_equal(streamed, pd.read_excel(fixed, dtype=str)[["id", "name"]])
+    assert messages == ["narrow.xlsx: left out the cells past column 2 in 2 row(s)"]
@@ -0,0 +1,253 @@
+# -------------------------ABOUT --------------------------
+
+# Headless watch-folder mode for main.py: loads the bottoms_up database
+# once, then keeps polling files_to_process/ and enriches every new or
+# changed file as soon as it has finished landing. When the .db file (or a
+# shard) in bu_database/ is replaced, the new index is built in the background and
+# swapped in between files, so queued work keeps going on the old one.
+#
+#   python watch.py [--interval 2] [--workers 4] [--backend sqlite]
+
+# ---------------------------------------------------------
+
+import argparse
+import os
+import threading
+import time
+from collections import namedtuple
+
+from main import (
+    BOTTOMS_UP_FOLDER, INPUT_EXTENSIONS, INPUT_FOLDER, OUTPUT_FOLDER, OUTPUT_FORMATS, STREAM_CHUNK_ROWS, MatchMemo,
+    RunManifest, find_bottoms_up_dbs, open_lookup, output_settings, run_files, start_worker_pool, stop_worker_pool,
+)
+from run_report import RunReport
+
+
+# seconds between two scans of the input and database folders
+WATCH_POLL_SEC = 2.0
+
+# one loaded version of the database (its .db file, or every shard): the
+# lookup built from it and the run manifest whose outputs were produced
+# against it
+LoadedIndex = namedtuple("LoadedIndex", ["db_paths", "signature", "lookup", "manifest"])
+
+
+def file_signature(path):
+    """(size, mtime_ns) of path, or None when it is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def db_names(db_paths):
+    return ", ".join(os.path.basename(db_path) for db_path in db_paths)
+
+
+class WarmIndex:
+    """The lookup for the current .db file, kept loaded between files.
+
+    refresh() notices a replaced database, waits until the file has
+    stopped changing, then loads it on a background thread. The running
+    index stays in use until the new one is complete; refresh() then swaps
+    it in, so every batch of files is matched against exactly one version.
+    A database that fails to load is logged and retried only once the
+    file changes again.
+    """
+
+    def __init__(self, BOTTOMS_UP_FOLDER, OUTPUT_FOLDER, backend="memory", use_cache=True, output_options=None,
+                 logger=print):
+        self.BOTTOMS_UP_FOLDER = BOTTOMS_UP_FOLDER
+        self.OUTPUT_FOLDER = OUTPUT_FOLDER
+        self.backend = backend
+        self.use_cache = use_cache
+        # output_settings() arguments other than the backend and database
+        self.output_options = output_options or {}
+        self.logger = logger
+        self.current = None
+        self._seen = None
+        self._failed = None
+        self._loader = None
+        self._result = None
+
+    def load(self):
+        """Load the database in the foreground (at startup)."""
+        self.current = self._load(*self._db_signature(self.logger))
+        return self.current
+
+    def _db_signature(self, logger):
+        db_paths = tuple(find_bottoms_up_dbs(self.BOTTOMS_UP_FOLDER, logger=logger))
+        return db_paths, tuple(map(file_signature, db_paths))
+
+    def _load(self, db_paths, signature):
+        # the signature is taken before loading: a database replaced while
+        # it was being read no longer matches and is loaded again
+        settings = output_settings(**self.output_options, backend=self.backend, db_paths=db_paths)
+        manifest = RunManifest(self.OUTPUT_FOLDER, db_paths, settings, logger=self.logger)
+        lookup = open_lookup(self.BOTTOMS_UP_FOLDER, self.backend, logger=self.logger, use_cache=self.use_cache)
+        return LoadedIndex(db_paths, signature, lookup, manifest)
+
+    def _load_in_background(self, db_paths, signature):
+        try:
+            self._result = self._load(db_paths, signature)
+        except Exception as e:
+            self._result = e
+
+    def refresh(self):
+        """Check the database folder; True when a reloaded index was swapped in."""
+        if self._loader is not None:
+            if self._loader.is_alive():
+                return False
+            self._loader.join()
+            self._loader, result = None, self._result
+            self._result = None
+            if isinstance(result, Exception):
+                self._failed = self._seen
+                self.logger(f"Could not reload the database, still using {db_names(self.current.db_paths)}: {result}")
+                return False
+            self.current = result
+            self.logger(f"Reloaded the database from {db_names(result.db_paths)}.")
+            return True
+
+        try:
+            seen = self._db_signature(lambda message: None)
+        except (RuntimeError, OSError):
+            # no .db file: mid-replacement, wait for it
+            return False
+        if None in seen[1] or seen == (self.current.db_paths, self.current.signature) or seen == self._failed:
+            self._seen = None
+            return False
+        if seen != self._seen:
+            # changed since the last poll: wait until the copy has settled
+            self._seen = seen
+            return False
+
+        self.logger(f"Database {db_names(seen[0])} changed; loading it in the background.")
+        self._loader = threading.Thread(target=self._load_in_background, args=seen, daemon=True)
+        self._loader.start()
+        return False
+
+
+class FolderWatcher:
+    """Input files that have finished landing in a folder.
+
+    A file is ready once its size and mtime are unchanged between two
+    scans. Files that failed (or were skipped) are left alone until they change.
+    """
+
+    def __init__(self, INPUT_FOLDER):
+        self.INPUT_FOLDER = INPUT_FOLDER
+        self.signatures = {}
+        self.failed = {}
+
+    def scan(self):
+        """(all input files, the ones ready to process)."""
+        files = sorted(
+            f for f in os.listdir(self.INPUT_FOLDER)
+            # ~$name.xlsx is Excel's lock file for an open workbook
+            if f.endswith(INPUT_EXTENSIONS) and not f.startswith("~$")
+        )
+        previous, self.signatures = self.signatures, {
+            f: file_signature(os.path.join(self.INPUT_FOLDER, f)) for f in files
+        }
+        self.failed = {f: sig for f, sig in self.failed.items() if self.signatures.get(f) == sig}
+        ready = [
+            f for f in files
+            if self.signatures[f] is not None and previous.get(f) == self.signatures[f] and f not in self.failed
+        ]
+        return files, ready
+
+    def mark_failed(self, filename):
+        self.failed[filename] = self.signatures.get(filename)
+
+
+def watch(INPUT_FOLDER=INPUT_FOLDER, OUTPUT_FOLDER=OUTPUT_FOLDER, BOTTOMS_UP_FOLDER=BOTTOMS_UP_FOLDER, logger=print,
+          poll_interval=WATCH_POLL_SEC, use_cache=True, backend="memory", stream_csv=False, stream_excel=False,
+          stream_chunk_rows=STREAM_CHUNK_ROWS, workers=1, report=True, memoize=True, multi_key=False,
+          output_format=None, stop_event=None):
+    """Run main()'s processing on every file that lands in INPUT_FOLDER until
+    stop_event is set (or Ctrl+C). Options are those of main(); a run
+    report is written for every batch of files processed."""
+    for folder in [INPUT_FOLDER, OUTPUT_FOLDER, BOTTOMS_UP_FOLDER]:
+        os.makedirs(folder, exist_ok=True)
+    if stop_event is None:
+        stop_event = threading.Event()
+
+    index = WarmIndex(BOTTOMS_UP_FOLDER, OUTPUT_FOLDER, backend, use_cache,
+                      {"multi_key": multi_key, "output_format": output_format}, logger)
+    index.load()
+    watcher = FolderWatcher(INPUT_FOLDER)
+    pool = None
+    if workers > 1:
+        pool = start_worker_pool(workers, index.current.lookup, BOTTOMS_UP_FOLDER, backend, use_cache, logger)
+    logger(f"Watching {INPUT_FOLDER} (Ctrl+C to stop).")
+
+    def process(files):
+        loaded = index.current
+        run_report = RunReport(backend=backend, workers=workers, use_cache=use_cache, stream_csv=stream_csv,
+                               stream_excel=stream_excel, memoize=memoize, multi_key=multi_key,
+                               output_format=output_format, watch=True)
+        try:
+            run_files(files, loaded.lookup, INPUT_FOLDER, OUTPUT_FOLDER, logger, None, stream_csv, stream_excel,
+                      stream_chunk_rows, pool, run_report, loaded.manifest,
+                      MatchMemo(loaded.lookup) if memoize else None, multi_key, output_format, popups=False)
+            # files that failed or were skipped on their own are retried once they change
+            for filename, file_report in run_report.files.items():
+                if file_report.get("status", "").startswith(("failed", "skipped")):
+                    watcher.mark_failed(filename)
+        except Exception as e:
+            run_report.status = f"failed: {e}"
+            if len(files) == 1:
+                watcher.mark_failed(files[0])
+                logger(f"Failed to process {files[0]}: {e}")
+            else:
+                # find the culprit: finished files are skipped by the manifest
+                for filename in loaded.manifest.pending(files, INPUT_FOLDER):
+                    process([filename])
+        finally:
+            if report and run_report.files:
+                try:
+                    logger(f"Run report saved to {run_report.write(OUTPUT_FOLDER)}")
+                except OSError as e:
+                    logger(f"Could not write run report: {e}")
+
+    try:
+        while not stop_event.is_set():
+            if index.refresh() and pool is not None:
+                # forked workers hold the old index; start them over on the new one
+                stop_worker_pool(pool)
+                pool = start_worker_pool(workers, index.current.lookup, BOTTOMS_UP_FOLDER, backend, use_cache, logger)
+
+            files, ready = watcher.scan()
+            manifest = index.current.manifest
+            manifest.prune(files)
+            pending = manifest.pending(ready, INPUT_FOLDER)
+            if pending:
+                logger(f"Processing {len(pending)} file(s): {', '.join(pending)}")
+                started = time.perf_counter()
+                process(pending)
+                logger(f"Done in {time.perf_counter() - started:.1f}s; watching for more files.")
+            stop_event.wait(poll_interval)
+    except KeyboardInterrupt:
+        logger("Stopped watching.")
+    finally:
+        if pool is not None:
+            stop_worker_pool(pool)
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="Enrich files as they land in files_to_process/.")
+    parser.add_argument("--interval", type=float, default=WATCH_POLL_SEC, help="seconds between folder scans")
+    parser.add_argument("--backend", default="memory", choices=["memory", "sqlite", "snapshot"])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--stream", action="store_true", help="stream CSV and XLSX inputs")
+    parser.add_argument("--multi-key", action="store_true", help="match on every key column a file has")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, help="output file format (default: same as input)")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the index cache")
+    args = parser.parse_args()
+    watch(poll_interval=args.interval, backend=args.backend, workers=args.workers, stream_csv=args.stream,
+          stream_excel=args.stream, multi_key=args.multi_key, output_format=args.output_format,
+          use_cache=not args.no_cache)